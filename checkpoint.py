@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+from datetime import date
+
+from config import DAYS_AGO, NUM_STARS
+from db import connect
+from gh_search import SearchPartition
+from sql_utils import save_results_to_db
+
+# units run on several threads, their writes to the database go one at a time
+_write_lock = threading.RLock()
+
+
+def _worker():
+    return f"{os.getpid()}:{threading.current_thread().name}"
+
+
+def _dump_partition(partition):
+    return json.dumps(
+        {
+            "keyword": partition.keyword,
+            "min_stars": partition.min_stars,
+            "max_stars": partition.max_stars,
+            "pushed_from": partition.pushed_from.isoformat(),
+            "pushed_to": partition.pushed_to and partition.pushed_to.isoformat(),
+            "total_count": partition.total_count,
+        }
+    )
+
+
+def _load_partition(text):
+    data = json.loads(text)
+    data["pushed_from"] = date.fromisoformat(data["pushed_from"])
+    if data["pushed_to"] is not None:
+        data["pushed_to"] = date.fromisoformat(data["pushed_to"])
+    return SearchPartition(**data)
+
+
+def create_checkpoint_tables():
+    """Create the tables tracking the units of work of a fetch run.
+
+    A unit is either the partition plan of a keyword (partition is NULL) or
+    the search of one partition, whose pages are tracked one by one. A unit
+    belongs to the worker of the run that registered or resumed it.
+    """
+    conn = connect()
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS fetch_units
+            (unit TEXT PRIMARY KEY,
+            keyword TEXT NOT NULL,
+            partition TEXT DEFAULT NULL,
+            state TEXT DEFAULT 'pending',
+            worker TEXT DEFAULT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"""
+    )
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(fetch_units)")}
+    if "worker" not in columns:
+        conn.execute("ALTER TABLE fetch_units ADD COLUMN worker TEXT DEFAULT NULL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS fetch_pages
+            (unit TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            state TEXT DEFAULT 'pending',
+            worker TEXT DEFAULT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (unit, page))"""
+    )
+    conn.commit()
+    conn.close()
+
+
+def clear_checkpoints():
+    """Forget the units of the previous run."""
+    conn = connect()
+    conn.execute("DELETE FROM fetch_pages")
+    conn.execute("DELETE FROM fetch_units")
+    conn.commit()
+    conn.close()
+
+
+def register_keywords(keywords):
+    """Record the keywords of a new run, each waiting for its partition plan."""
+    conn = connect()
+    worker = _worker()
+    conn.executemany(
+        "INSERT OR IGNORE INTO fetch_units (unit, keyword, worker) VALUES (?, ?, ?)",
+        [(f"plan:{keyword}", keyword, worker) for keyword in keywords],
+    )
+    conn.commit()
+    conn.close()
+
+
+def register_partitions(keyword, partitions):
+    """Record the partitions planned for keyword, and mark its plan done."""
+    with _write_lock:
+        conn = connect()
+        worker = _worker()
+        conn.executemany(
+            "INSERT OR IGNORE INTO fetch_units (unit, keyword, partition, worker) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (partition.query(), keyword, _dump_partition(partition), worker)
+                for partition in partitions
+            ],
+        )
+        conn.execute(
+            "UPDATE fetch_units SET state='done', updated_at=CURRENT_TIMESTAMP "
+            "WHERE unit=?",
+            (f"plan:{keyword}",),
+        )
+        conn.commit()
+        conn.close()
+
+
+def _is_running(worker):
+    """Tell whether the process of a worker is still running on this machine"""
+    pid = int(worker.split(":", 1)[0]) if worker else None
+    if pid is None or pid == os.getpid() or os.name != "posix":
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running, as another user
+        return True
+    return True
+
+
+def load_unfinished_units():
+    """Get what is left of an interrupted run.
+
+    Returns the keywords still to plan, the partitions still to fetch along
+    with the first page that is not done, and the number of units left to a
+    fetch still running. Pages left in progress by workers whose process is
+    gone are pending again. A unit claimed by a running process, or with a
+    page in progress in one, belongs to that process and is not returned;
+    the units returned are claimed by the caller.
+    """
+    conn = connect()
+    # one run at a time takes over the units left, the other sees them claimed
+    conn.execute("BEGIN IMMEDIATE")
+    running, stale = set(), []
+    for unit, page, worker in conn.execute(
+        "SELECT unit, page, worker FROM fetch_pages WHERE state='in_progress'"
+    ).fetchall():
+        if _is_running(worker):
+            running.add(unit)
+        else:
+            stale.append((unit, page))
+    conn.executemany(
+        "UPDATE fetch_pages SET state='pending' WHERE unit=? AND page=?", stale
+    )
+    rows = conn.execute(
+        """
+        SELECT u.unit, u.keyword, u.partition, u.worker, (
+            SELECT MIN(p.page) FROM fetch_pages p
+            WHERE p.unit = u.unit AND p.state != 'done'
+        ), (
+            SELECT MAX(p.page) + 1 FROM fetch_pages p
+            WHERE p.unit = u.unit AND p.state = 'done'
+        )
+        FROM fetch_units u WHERE u.state != 'done'
+        """
+    ).fetchall()
+    keywords, partitions, claimed = [], [], []
+    for unit, keyword, partition, worker, first_pending, after_done in rows:
+        if unit in running or _is_running(worker):
+            running.add(unit)
+            continue
+        claimed.append(unit)
+        if partition is None:
+            keywords.append(keyword)
+        else:
+            start_page = first_pending if first_pending is not None else after_done
+            partitions.append((_load_partition(partition), start_page or 0))
+    conn.executemany(
+        "UPDATE fetch_units SET worker=?, updated_at=CURRENT_TIMESTAMP WHERE unit=?",
+        [(_worker(), unit) for unit in claimed],
+    )
+    conn.commit()
+    conn.close()
+    return keywords, partitions, len(running)
+
+
+def mark_page(unit, page, state):
+    """Move a page of unit to state: pending, in_progress or done."""
+    with _write_lock:
+        conn = connect()
+        conn.execute(
+            """INSERT INTO fetch_pages (unit, page, state, worker) VALUES (?, ?, ?, ?)
+                ON CONFLICT(unit, page) DO UPDATE SET
+                    state=excluded.state, worker=excluded.worker,
+                    updated_at=CURRENT_TIMESTAMP""",
+            (unit, page, state, _worker()),
+        )
+        conn.commit()
+        conn.close()
+
+
+def save_records(records):
+    """Save hydrated records, one writer at a time."""
+    with _write_lock:
+        save_results_to_db(records, NUM_STARS, DAYS_AGO)
+
+
+def mark_unit_done(unit):
+    """Record that every page of unit is done."""
+    with _write_lock:
+        conn = connect()
+        conn.execute(
+            "UPDATE fetch_units SET state='done', updated_at=CURRENT_TIMESTAMP "
+            "WHERE unit=?",
+            (unit,),
+        )
+        conn.commit()
+        conn.close()
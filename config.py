@@ -6,3 +6,49 @@ PROGRESS_FILE = config["PROGRESS_FILE"]
 NUM_STARS = config["NUM_STARS"]
 DAYS_AGO = config["DAYS_AGO"]
 README_KEYWORDS = config["README_KEYWORDS"]
+HYDRATION_MODE = config.get("HYDRATION_MODE", "rest")
+GRAPHQL_BATCH_SIZE = config.get("GRAPHQL_BATCH_SIZE", 25)
+GRAPHQL_FIXTURE_MODE = config.get("GRAPHQL_FIXTURE_MODE", "live")
+GRAPHQL_FIXTURES_DIR = config.get("GRAPHQL_FIXTURES_DIR", "./fixtures/graphql")
+HYDRATION_CONCURRENCY = config.get("HYDRATION_CONCURRENCY", 1)
+HYDRATION_SUBREQUESTS = config.get("HYDRATION_SUBREQUESTS", 1)
+KEYWORD_CONCURRENCY = config.get("KEYWORD_CONCURRENCY", 1)
+HTTP_CACHE = config.get("HTTP_CACHE", True)
+HTTP_CACHE_PATH = config.get("HTTP_CACHE_PATH", "./db/http_cache.sqlite")
+HTTP_CACHE_MAX_MB = config.get("HTTP_CACHE_MAX_MB", 512)
+RATE_LIMIT_PACE = config.get("RATE_LIMIT_PACE", True)
+SECONDARY_LIMIT_RETRIES = config.get("SECONDARY_LIMIT_RETRIES", 3)
+SEARCH_PER_PAGE = config.get("SEARCH_PER_PAGE", 30)
+INCREMENTAL_REFRESH = config.get("INCREMENTAL_REFRESH", False)
+HYDRATION_FRESHNESS_HOURS = config.get("HYDRATION_FRESHNESS_HOURS", 0)
+WRITE_QUEUE_SIZE = config.get("WRITE_QUEUE_SIZE", 1000)
+WRITE_BATCH_SIZE = config.get("WRITE_BATCH_SIZE", 100)
+# point at a gh_standin server to fetch offline
+GITHUB_API_URL = config.get("GITHUB_API_URL", "https://api.github.com")
+README_SOURCE = config.get("README_SOURCE", "raw")
+README_RAW_HOST = config.get("README_RAW_HOST", "https://raw.githubusercontent.com")
+README_MAX_BYTES = config.get("README_MAX_BYTES", 512 * 1024)
+# written with .json and .prom suffixes at the end of a fetch
+TELEMETRY_REPORT = config.get("TELEMETRY_REPORT", "./results/github_telemetry")
+DB_PATH = config.get("DB_PATH", "./db/repos.sqlite")
+DB_JOURNAL_MODE = config.get("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = config.get("DB_SYNCHRONOUS", "NORMAL")
+DB_MMAP_MB = config.get("DB_MMAP_MB", 256)
+DB_CACHE_MB = config.get("DB_CACHE_MB", 64)
+DB_BUSY_TIMEOUT_MS = config.get("DB_BUSY_TIMEOUT_MS", 30000)
+# repo_metrics keeps daily points this long, then weekly ones until
+# METRICS_WEEKLY_DAYS, then monthly ones
+METRICS_DAILY_DAYS = config.get("METRICS_DAILY_DAYS", 90)
+METRICS_WEEKLY_DAYS = config.get("METRICS_WEEKLY_DAYS", 365)
+# rows enriched by process_repo_details between commits
+PROCESS_BATCH_SIZE = config.get("PROCESS_BATCH_SIZE", 20)
+# rows enriched at once by process_repo_details, under the shared OpenAI budget
+ENRICH_CONCURRENCY = config.get("ENRICH_CONCURRENCY", 8)
+LLM_CACHE = config.get("LLM_CACHE", True)
+LLM_CACHE_PATH = config.get("LLM_CACHE_PATH", "./db/llm_cache.sqlite")
+LLM_CACHE_MAX_MB = config.get("LLM_CACHE_MAX_MB", 256)
+LLM_CACHE_TTL_DAYS = config.get("LLM_CACHE_TTL_DAYS", 90)
+# use, refresh (ask again and overwrite) or bypass
+LLM_CACHE_MODE = config.get("LLM_CACHE_MODE", "use")
+# separate: one request per field; combined: one function call request for all
+ENRICH_MODE = config.get("ENRICH_MODE", "separate")
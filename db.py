@@ -0,0 +1,39 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from config import (DB_BUSY_TIMEOUT_MS, DB_CACHE_MB, DB_JOURNAL_MODE,
+                    DB_MMAP_MB, DB_PATH, DB_SYNCHRONOUS)
+
+
+def _apply_pragmas(conn):
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_MB) * 1024 * 1024}")
+    # a negative cache_size is in KiB rather than in pages
+    conn.execute(f"PRAGMA cache_size={-int(DB_CACHE_MB) * 1024}")
+
+
+def connect(path=DB_PATH, readonly=False):
+    """Open the repos database with the configured pragmas.
+
+    Read-only connections never take the write lock, so with WAL journaling
+    exports and queries run while a fetch is writing.
+    """
+    if readonly:
+        conn = sqlite3.connect(
+            f"{Path(path).resolve().as_uri()}?mode=ro",
+            uri=True,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        )
+        _apply_pragmas(conn)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    _apply_pragmas(conn)
+    # WAL is persistent, the database keeps it once a connection sets it
+    conn.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    # NORMAL only syncs at WAL checkpoints, a crash may lose the last commits
+    # but never corrupts the database
+    conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    return conn
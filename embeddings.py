@@ -8,6 +8,8 @@ from pyrate_limiter import Duration, Limiter, RequestRate
 from sentence_transformers import SentenceTransformer
 from sklearn.preprocessing import normalize
 
+from openai_utils import version_of
+
 rate_limits = (RequestRate(50, Duration.MINUTE),)
 limiter = Limiter(*rate_limits)
 # device = "xpu" if torch.xpu.is_available() else "cpu"
@@ -31,6 +33,8 @@ openai_embeddings_filename = "./embeddings/openai_embeddings.pkl"
 transformer_embeddings_filename = "./embeddings/transformer_embeddings.pkl"
 model_name = "all-MiniLM-L6-v2"
 texts = list(category_examples.values())
+# stored along with class_label, a new model or new examples make it stale
+CLASSIFIER_VERSION = version_of(model_name, category_examples)
 tr_model = SentenceTransformer(model_name, device=device)
 
 
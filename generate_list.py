@@ -40,17 +40,32 @@ def fix_csv_file(input_file):
 
 
 import io
-import sqlite3
+
+from config import DB_PATH
+from db import connect
 
 
 def extract_repo_name(repo_url):
     return repo_url.split("/")[-1]
 
 
-def save_db_to_markdown(db_fname, chunk_size=100, ignored_urls=[]):
-    conn = sqlite3.connect(db_fname)
+def save_db_to_markdown(db_fname, chunk_size=100, ignored_urls=[], keyword=None):
+    # read-only, so the list can be exported while a fetch is writing
+    conn = connect(db_fname, readonly=True)
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM repo_details")
+    # relevance and stars are indexed, and keyword goes through the
+    # repo_keywords key, so only the listed repos are read
+    found_by = "JOIN repo_keywords f ON f.id = d.id AND f.keyword = ?" if keyword else ""
+    cursor.execute(
+        f"""SELECT d.url, d.brief_desc, d.stars_count, d.keyword,
+            (SELECT group_concat(k.keyword, ', ') FROM repo_keywords k
+                WHERE k.id = d.id AND k.keyword != d.keyword),
+            d.is_relevant, d.class_label
+        FROM repo_details d {found_by}
+        WHERE d.is_relevant >= 0.4
+        ORDER BY d.stars_count DESC""",
+        (keyword,) if keyword else (),
+    )
     mkdwn_fname = "AwesomeList.md"
     with open(mkdwn_fname, "w") as f:
         f.write("# Awesome GitHub Repos\n\n")
@@ -66,46 +81,26 @@ def save_db_to_markdown(db_fname, chunk_size=100, ignored_urls=[]):
 
             for row in rows:
                 (
-                    _,
                     repo_url,
-                    license_spdx,
-                    _,
+                    brief_desc,
                     star_count,
-                    forks_count,
-                    pushed_at,
-                    _,
-                    _,
-                    languages,
-                    topics,
-                    open_issues,
-                    closed_issues,
-                    description,
-                    fork,
-                    size,
-                    watchers_count,
-                    language,
-                    keyword,
-                    additional_keywords,
+                    first_keyword,
+                    other_keywords,
                     is_relevant,
-                    brief_desc,
                     class_label,
-                    _,
-                    _,
-                    _,
                 ) = row
                 if repo_url in ignored_urls:
                     continue
-                if is_relevant >= 0.4:
-                    print(f"relevant score: {is_relevant}")
-                    repo_name = extract_repo_name(repo_url)
-                    if class_label not in topic_dict:
-                        topic_dict[class_label] = f"### {class_label}\n\n"
-                        table_of_contents += f"- [{class_label}](#{class_label.lower().replace(' ', '-')})\n"
-                    repo_details = f"""
+                print(f"relevant score: {is_relevant}")
+                repo_name = extract_repo_name(repo_url)
+                if class_label not in topic_dict:
+                    topic_dict[class_label] = f"### {class_label}\n\n"
+                    table_of_contents += f"- [{class_label}](#{class_label.lower().replace(' ', '-')})\n"
+                repo_details = f"""
 - **[{repo_name}]({repo_url})** - {brief_desc} ![GitHub stars](https://img.shields.io/badge/stars-{star_count}-blue)
-    - OneAPI components: {keyword}, {",".join(additional_keywords.split("|"))}
+    - OneAPI components: {first_keyword}, {other_keywords or ""}
     - auto_generated = True\n\n"""
-                    topic_dict[class_label] += repo_details
+                topic_dict[class_label] += repo_details
         f.write(table_of_contents)
         f.write("\n")
         for topic_content in topic_dict.values():
@@ -196,7 +191,7 @@ def export():
         "https://github.com/r0f1/datascience",
         "https://github.com/IntelPython/scikit-learn_bench",
     ]
-    save_db_to_markdown(db_fname="./db/repos.sqlite", ignored_urls=ignored_urls)
+    save_db_to_markdown(db_fname=DB_PATH, ignored_urls=ignored_urls)
 
 
 if __name__ == "__main__":
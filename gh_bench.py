@@ -0,0 +1,180 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from gh_standin import WINDOWS, Corpus, StandinServer
+
+app = typer.Typer()
+console = Console()
+
+STRATEGIES = ["rest", "payload", "graphql"]
+
+
+def _hydrate(strategy, gh_repos, repo_executor, sub_executor, graphql):
+    from repo_details import RepoDetails
+
+    if strategy == "graphql":
+        return graphql.fetch_page(gh_repos)
+
+    def hydrate(repo):
+        if strategy == "payload":
+            return RepoDetails.from_search_payload(repo, sub_executor)
+        return RepoDetails(repo, sub_executor)
+
+    if repo_executor is None:
+        return [hydrate(repo) for repo in gh_repos]
+    return list(repo_executor.map(hydrate, gh_repos))
+
+
+def run_strategy(
+    server,
+    strategy,
+    keyword,
+    num_stars,
+    days_ago,
+    concurrency,
+    subrequests,
+    pace=False,
+):
+    """Fetch every repo matching keyword with strategy, return what it cost.
+
+    Without pace, requests go out as fast as the budgets allow, so the timings
+    compare the strategies rather than the spacing of RATE_LIMIT_PACE.
+    """
+    import gh_readme
+    from gh_graphql import GraphQLFetcher
+    from gh_http import get_github
+    from gh_search import plan_partitions, search_page
+    from gh_tokens import token_pool
+
+    server.reset()
+    # readmes read from the raw content host come from the stand-in too
+    gh_readme.README_RAW_HOST = f"{server.url}/raw"
+    token_pool.reset(pace=pace)
+    gh_instance = get_github(base_url=server.url, per_page=100)
+    graphql = GraphQLFetcher(api_url=server.url) if strategy == "graphql" else None
+    repo_executor = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+    sub_executor = ThreadPoolExecutor(subrequests) if subrequests > 1 else None
+    num_repos = 0
+    start = time.perf_counter()
+    try:
+        for partition in plan_partitions(gh_instance, keyword, num_stars, days_ago):
+            for page in range(partition.num_pages):
+                gh_repos = (
+                    partition.first_page
+                    if page == 0
+                    else search_page(gh_instance, partition, page)
+                )
+                num_repos += len(
+                    _hydrate(strategy, gh_repos, repo_executor, sub_executor, graphql)
+                )
+    finally:
+        for executor in (repo_executor, sub_executor):
+            if executor is not None:
+                executor.shutdown()
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    return {
+        "strategy": strategy,
+        "repos": num_repos,
+        "seconds": elapsed,
+        "requests": stats["total"],
+        "limited": stats["statuses"].get("403", 0),
+        "slept": token_pool.slept,
+        "routes": stats["routes"],
+    }
+
+
+@app.command()
+def bench(
+    strategy: Optional[List[str]] = typer.Option(
+        None, help=f"Strategy to run, repeatable: {', '.join(STRATEGIES)}"
+    ),
+    repos: int = typer.Option(300, help="Number of synthetic repos served"),
+    corpus: Optional[str] = typer.Option(None, help="Serve a saved corpus instead"),
+    keyword: str = typer.Option("oneapi", help="Keyword searched for"),
+    num_stars: int = typer.Option(0, help="Minimum number of stars"),
+    days_ago: int = typer.Option(365, help="Only repos pushed since"),
+    concurrency: int = typer.Option(1, help="Repos hydrated at once"),
+    subrequests: int = typer.Option(1, help="Sub-resources fetched at once"),
+    tokens: int = typer.Option(1, help="Number of stand-in tokens in the pool"),
+    latency_ms: float = typer.Option(20, help="Delay of every answer"),
+    jitter_ms: float = typer.Option(10, help="Random extra delay, up to this"),
+    secondary_rate: float = typer.Option(
+        0, help="Share of requests answered with a secondary rate limit"
+    ),
+    search_limit: int = typer.Option(30, help="Search budget per window"),
+    core_limit: int = typer.Option(5000, help="Core budget per window"),
+    search_window: int = typer.Option(WINDOWS["search"], help="Search window (s)"),
+    core_window: int = typer.Option(WINDOWS["core"], help="Core window (s)"),
+    pace: bool = typer.Option(
+        False, help="Spread requests over the windows, as RATE_LIMIT_PACE does"
+    ),
+    cache: bool = typer.Option(False, help="Keep the http cache on"),
+    verbose: bool = typer.Option(False, help="Show the requests of every route"),
+):
+    """Report repos per second and requests per repo of every fetch strategy.
+
+    Runs against a local gh_standin server, so it costs no GitHub quota.
+    """
+    # stand-in tokens, so real ones are never sent anywhere; set before the pool
+    # of gh_tokens is created
+    os.environ["GTOKENS"] = ",".join(f"standin-{i}" for i in range(tokens))
+    import gh_http
+
+    if not cache:
+        gh_http.disable_http_cache()
+    served = Corpus.load(corpus) if corpus else Corpus.synthetic(repos, [keyword])
+    table = Table(title=f"fetching '{keyword}' from {len(served.repos)} repos")
+    for column in (
+        "strategy",
+        "repos",
+        "seconds",
+        "repos/s",
+        "requests",
+        "requests/repo",
+        "403s",
+        "slept (s)",
+    ):
+        table.add_column(column, justify="right")
+    with StandinServer(
+        served,
+        latency=latency_ms / 1000,
+        jitter=jitter_ms / 1000,
+        secondary_rate=secondary_rate,
+        limits={"search": search_limit, "core": core_limit},
+        windows={"search": search_window, "core": core_window},
+    ) as server:
+        for name in strategy or STRATEGIES:
+            result = run_strategy(
+                server,
+                name,
+                keyword,
+                num_stars,
+                days_ago,
+                concurrency,
+                subrequests,
+                pace=pace,
+            )
+            table.add_row(
+                name,
+                str(result["repos"]),
+                f"{result['seconds']:.2f}",
+                f"{result['repos'] / result['seconds']:.1f}",
+                str(result["requests"]),
+                f"{result['requests'] / max(result['repos'], 1):.2f}",
+                str(result["limited"]),
+                f"{result['slept']:.1f}",
+            )
+            if verbose:
+                console.print(name, result["routes"])
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
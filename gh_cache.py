@@ -0,0 +1,42 @@
+import json
+
+from lru_store import LRUStore
+
+
+class ResponseCache(LRUStore):
+    """On-disk cache of GitHub responses keyed by request, revalidated with ETags.
+
+    Entries are evicted least recently used first once the stored bodies grow
+    past max_bytes.
+    """
+
+    def __init__(self, path, max_bytes):
+        super().__init__(
+            path,
+            "responses",
+            max_bytes,
+            columns=("etag TEXT", "last_modified TEXT", "headers TEXT"),
+        )
+
+    def get(self, key):
+        """Get the validators, headers and body stored for a request, or None"""
+        row = self._get(key, "etag", "last_modified", "headers")
+        if row is None:
+            return None
+        etag, last_modified, headers, body = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "headers": json.loads(headers),
+            "body": body,
+        }
+
+    def put(self, key, etag, last_modified, headers, body):
+        """Store a response body along with its validators"""
+        self._put(
+            key,
+            body,
+            etag=etag,
+            last_modified=last_modified,
+            headers=json.dumps(headers),
+        )
@@ -1,11 +1,20 @@
-import json
 import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from github import Github
-
-from config import DAYS_AGO, NUM_STARS, PROGRESS_FILE, README_KEYWORDS
-from gh_process import RepoProcessor
-from sql_utils import reset_repo_info, save_results_to_db
+from checkpoint import (clear_checkpoints, create_checkpoint_tables,
+                        load_unfinished_units, register_keywords,
+                        register_partitions)
+from config import (DAYS_AGO, INCREMENTAL_REFRESH, KEYWORD_CONCURRENCY,
+                    NUM_STARS, README_KEYWORDS, SEARCH_PER_PAGE,
+                    TELEMETRY_REPORT)
+from gh_http import get_github, get_http_cache
+from gh_pipeline import DbWriter
+from gh_process import RepoProcessor, make_progress
+from gh_search import plan_partitions
+from gh_telemetry import telemetry
+from gh_tokens import load_tokens
+from sql_utils import (downsample_repo_metrics, ensure_tables,
+                       prune_replaced_readmes, reset_repo_info)
 from suppress_warnings import *
 from utils import create_dir, print
 
@@ -17,52 +26,111 @@ def _check_env():
         print(
             "\nExport 'OPENAI_API_KEY=<openai_api_key>' to your environment, to use openai emebddings."
         )
-    try:
-        os.environ["GTOKEN"]
-    except KeyError:
+    if not load_tokens():
         print(
-            "\nExport 'GTOKEN=<github_token>' to your environment, it is a prerequisite to continue, exiting..."
+            "\nExport 'GTOKEN=<github_token>' (or 'GTOKENS=<token1>,<token2>,...') to your environment, it is a prerequisite to continue, exiting..."
         )
         sys.exit(0)
 
 
-def _get_progress_info():
-    last_keyword, last_page = None, None
-    if os.path.exists(PROGRESS_FILE):
-        with open(PROGRESS_FILE, "r") as progress_file:
-            progress_data = json.load(progress_file)
-            last_keyword = progress_data["keyword"]
-            last_page = progress_data["last_page"]
-    return last_keyword, last_page
+def _plan_keyword(gh_instance, keyword):
+    partitions = plan_partitions(gh_instance, keyword, NUM_STARS, DAYS_AGO)
+    register_partitions(keyword, partitions)
+    return partitions
 
 
-def fetch_and_save(gh_instance, last_keyword, last_page):
-    reset_repo_info()  # Reset the repo_details table before saving new data
-    process_all = False if last_keyword else True
+def fetch_and_save(gh_instance, listeners=()):
+    """Fetch the repos of every keyword into the database.
+
+    listeners are called from the writer thread with every batch of repos
+    saved, so later stages can start while fetching goes on.
+    """
     if README_KEYWORDS is None:
         print("No keywords found in awesome.toml, exiting...")
         sys.exit(0)
-    for kw in set(README_KEYWORDS):
-        if kw == last_keyword:
-            processor = RepoProcessor(gh_instance, kw, start_page=last_page)
-            process_all = True
-        elif process_all:
-            processor = RepoProcessor(gh_instance, kw)
-        else:
-            continue
-        filtered_repos = processor.fetch_filtered_repos()
-        save_results_to_db(filtered_repos, NUM_STARS, DAYS_AGO)
+    create_checkpoint_tables()
+    # before any fetch thread looks up the stored repos
+    ensure_tables()
+    keywords, resumed, running = load_unfinished_units()
+    if running and not (keywords or resumed):
+        print(f"another fetch is still on {running} units of work, exiting...")
+        sys.exit(0)
+    if keywords or resumed:
+        print(
+            f"resuming the last run: {len(keywords)} keywords to plan, "
+            f"{len(resumed)} search partitions to fetch"
+        )
+    else:
+        clear_checkpoints()
+        if not INCREMENTAL_REFRESH:
+            reset_repo_info()  # Reset the repo_details table before saving new data
+        keywords = set(README_KEYWORDS)
+        register_keywords(keywords)
+    # every keyword is split into search partitions under the result cap, and
+    # each partition is fetched as a unit of work of its own. Units run in
+    # parallel on the shared token budgets of gh_tokens, and stream every
+    # hydrated repo to a single database writer
+    executor = ThreadPoolExecutor(max_workers=KEYWORD_CONCURRENCY)
+    try:
+        with make_progress() as progress, DbWriter(listeners) as writer:
+
+            def submit_fetch(partition, start_page=0):
+                processor = RepoProcessor(
+                    gh_instance,
+                    partition.keyword,
+                    writer,
+                    start_page=start_page,
+                    progress=progress,
+                    partition=partition,
+                )
+                fetches[executor.submit(processor.fetch_filtered_repos)] = (
+                    partition.keyword
+                )
+
+            plans = {
+                executor.submit(_plan_keyword, gh_instance, kw): kw for kw in keywords
+            }
+            fetches = {}
+            for partition, start_page in resumed:
+                submit_fetch(partition, start_page)
+            while plans or fetches:
+                done, _ = wait([*plans, *fetches], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetches:
+                        del fetches[future]
+                        future.result()
+                        continue
+                    del plans[future]
+                    for partition in future.result():
+                        submit_fetch(partition)
+        # the readmes replaced by this run are no longer referred to
+        prune_replaced_readmes()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def fetch():
     _check_env()
-    gh_instance = Github(os.environ["GTOKEN"])
+    gh_instance = get_github(per_page=SEARCH_PER_PAGE)
     dir_path = create_dir("./results")
     try:
-        fetch_and_save(gh_instance, *_get_progress_info())
+        fetch_and_save(gh_instance)
+        downsample_repo_metrics()
+        http_cache = get_http_cache()
+        if http_cache is not None:
+            stats = http_cache.stats()
+            print(
+                f"http cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%}), {stats['evictions']} evictions"
+            )
     except KeyboardInterrupt:
         print("\nKeyboard interrupt detected. Exiting program.")
         sys.exit(0)
+    finally:
+        telemetry.write_json(f"{TELEMETRY_REPORT}.json")
+        telemetry.write_prometheus(f"{TELEMETRY_REPORT}.prom")
+        print(telemetry.summary())
+        print(f"github telemetry saved to {TELEMETRY_REPORT}.json and .prom")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+
+from config import GITHUB_API_URL, README_MAX_BYTES
+from gh_http import new_session
+from repo_details import RepoDetails, parse_timestamp
+from utils import preprocess_text
+
+README_PATHS = {
+    "readme_md": "HEAD:README.md",
+    "readme_lower_md": "HEAD:readme.md",
+    "readme_title_md": "HEAD:Readme.md",
+    "readme_rst": "HEAD:README.rst",
+    "readme_txt": "HEAD:README.txt",
+    "readme_plain": "HEAD:README",
+}
+
+REPO_FIELDS = """
+    ... on Repository {
+        databaseId
+        url
+        description
+        isFork
+        diskUsage
+        stargazerCount
+        forkCount
+        pushedAt
+        updatedAt
+        createdAt
+        primaryLanguage { name }
+        licenseInfo { name }
+        languages(first: 100) { edges { size node { name } } }
+        repositoryTopics(first: 100) { nodes { topic { name } } }
+        openIssues: issues(states: OPEN) { totalCount }
+        closedIssues: issues(states: CLOSED) { totalCount }
+        openPulls: pullRequests(states: OPEN) { totalCount }
+        closedPulls: pullRequests(states: [CLOSED, MERGED]) { totalCount }
+        %s
+    }
+""" % "\n        ".join(
+    f'{alias}: object(expression: "{path}") {{ ... on Blob {{ text }} }}'
+    for alias, path in README_PATHS.items()
+)
+
+REPOS_QUERY = """
+query($ids: [ID!]!) {
+    nodes(ids: $ids) {
+        %s
+    }
+}
+""" % REPO_FIELDS
+
+
+class GraphQLFetcher:
+    """Hydrate a whole page of search results with batched GraphQL queries.
+
+    mode is one of:
+        live   - query the GitHub GraphQL API
+        record - query the API and save every response to fixtures_dir
+        replay - serve responses from fixtures_dir, never touching the network
+    """
+
+    def __init__(self, batch_size=25, mode="live", fixtures_dir=None, api_url=None):
+        self.batch_size = batch_size
+        self.url = f"{(api_url or GITHUB_API_URL).rstrip('/')}/graphql"
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        # authenticated by GithubAdapter with a token of the shared pool
+        self.session = new_session()
+        if mode in ("record", "replay") and fixtures_dir is None:
+            raise ValueError(f"fixtures_dir is required in '{mode}' mode")
+
+    def _fixture_path(self, payload):
+        digest = hashlib.sha1(
+            json.dumps(payload, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.fixtures_dir, f"{digest}.json")
+
+    def execute(self, query, variables):
+        """Run a GraphQL query and return its data"""
+        payload = {"query": query, "variables": variables}
+        if self.mode == "replay":
+            with open(self._fixture_path(payload), "r") as fixture:
+                body = json.load(fixture)
+        else:
+            response = self.session.post(self.url, json=payload, timeout=60)
+            response.raise_for_status()
+            body = response.json()
+            if self.mode == "record":
+                os.makedirs(self.fixtures_dir, exist_ok=True)
+                with open(self._fixture_path(payload), "w") as fixture:
+                    json.dump(body, fixture)
+        if body.get("data") is None:
+            raise RuntimeError(f"GraphQL query failed: {body.get('errors')}")
+        return body["data"]
+
+    def fetch_page(self, gh_repos):
+        """Get the details of every repo in a search page, in the order given"""
+        all_repos_details = []
+        for start in range(0, len(gh_repos), self.batch_size):
+            batch = gh_repos[start : start + self.batch_size]
+            data = self.execute(
+                REPOS_QUERY, {"ids": [repo.node_id for repo in batch]}
+            )
+            for repo, node in zip(batch, data["nodes"]):
+                if node is None:
+                    # repo went private or was deleted after the search, use REST for it
+                    all_repos_details.append(RepoDetails(repo))
+                else:
+                    all_repos_details.append(self.to_repo_details(repo, node))
+        return all_repos_details
+
+    @staticmethod
+    def to_repo_details(repo, node):
+        """Map a GraphQL repository node onto the RepoDetails shape"""
+        readme = next(
+            (node[alias]["text"] for alias in README_PATHS if node.get(alias)), None
+        )
+        # blobs come whole, so the cap only bounds what is kept
+        encoded = readme.encode("utf-8") if readme is not None else b""
+        readme_truncated = len(encoded) > README_MAX_BYTES
+        if readme_truncated:
+            readme = encoded[:README_MAX_BYTES].decode("utf-8", errors="ignore")
+        license_info = node["licenseInfo"]
+        return RepoDetails.from_fields(
+            repo,
+            id=node["databaseId"],
+            url=node["url"],
+            license=license_info["name"] if license_info else "Unknown License",
+            readme=(
+                preprocess_text(readme.lower())
+                if readme is not None
+                else "no readme found"
+            ),
+            readme_truncated=readme_truncated,
+            stars_count=node["stargazerCount"],
+            forks_count=node["forkCount"],
+            pushed_at=parse_timestamp(node["pushedAt"]),
+            updated_at=parse_timestamp(node["updatedAt"]),
+            created_at=parse_timestamp(node["createdAt"]),
+            languages="| ".join(
+                f"{edge['node']['name']} ({edge['size']})"
+                for edge in node["languages"]["edges"]
+            ),
+            topics=[
+                topic["topic"]["name"] for topic in node["repositoryTopics"]["nodes"]
+            ],
+            # the REST issues endpoint counts pull requests as issues, keep that
+            open_issues=(
+                node["openIssues"]["totalCount"] + node["openPulls"]["totalCount"]
+            ),
+            closed_issues=(
+                node["closedIssues"]["totalCount"] + node["closedPulls"]["totalCount"]
+            ),
+            description=node["description"],
+            fork=1 if node["isFork"] else 0,
+            size=node["diskUsage"],
+            # REST watchers_count is an alias of the stargazer count
+            watchers_count=node["stargazerCount"],
+            language=(
+                node["primaryLanguage"]["name"] if node["primaryLanguage"] else None
+            ),
+        )
@@ -0,0 +1,236 @@
+import threading
+import time
+
+import requests
+from github import Github
+from github.Requester import (HTTPRequestsConnectionClass,
+                              HTTPSRequestsConnectionClass, Requester,
+                              RequestsResponse)
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from config import (GITHUB_API_URL, HTTP_CACHE, HTTP_CACHE_MAX_MB,
+                    HTTP_CACHE_PATH, HYDRATION_CONCURRENCY,
+                    HYDRATION_SUBREQUESTS, KEYWORD_CONCURRENCY,
+                    SECONDARY_LIMIT_RETRIES)
+from gh_cache import ResponseCache
+from gh_ratelimit import resource_for
+from gh_telemetry import endpoint_for, telemetry
+from gh_tokens import token_pool
+
+# headers describing the wire encoding of a body, not the body we keep
+_UNCACHED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+# connections kept alive per host: the keyword threads, and the hydration and
+# sub-resource pools they share, may all call GitHub at once
+POOL_MAXSIZE = max(
+    KEYWORD_CONCURRENCY + HYDRATION_CONCURRENCY + HYDRATION_SUBREQUESTS, 10
+)
+
+# opened on first use, so importing gh_http creates no file
+_http_cache = None
+_http_cache_enabled = HTTP_CACHE
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    """Get the shared response cache, None when it is turned off"""
+    global _http_cache
+    if not _http_cache_enabled:
+        return None
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = ResponseCache(
+                HTTP_CACHE_PATH, HTTP_CACHE_MAX_MB * 1024 * 1024
+            )
+    return _http_cache
+
+
+def disable_http_cache():
+    """Send every request uncached, as when measuring the cost of a fetch"""
+    global _http_cache_enabled
+    _http_cache_enabled = False
+
+
+def _cache_key(request):
+    return f"{request.method} {request.url} {request.headers.get('Accept', '')}"
+
+
+class GithubAdapter(HTTPAdapter):
+    """Transport for every GitHub call.
+
+    Requests are sent with the token of the shared pool that has the most
+    headroom, paced by its budget, and rate limited answers are retried once
+    the budget allows it. Cached GETs are revalidated with
+    ETags: a 304 Not Modified answer does not count against the rate limit, so
+    a re-run over an unchanged corpus costs almost no quota.
+    """
+
+    def send(self, request, **kwargs):
+        resource = resource_for(request.url)
+        endpoint = endpoint_for(request.method, request.url)
+        # looked up once, the validators it adds must not make a retry look like
+        # a conditional request of the caller
+        cacheable, cached = self._lookup(request)
+        for attempt in range(SECONDARY_LIMIT_RETRIES + 1):
+            token = token_pool.acquire(resource) if resource is not None else None
+            if token is not None:
+                request.headers["Authorization"] = f"token {token}"
+            started = time.monotonic()
+            response = self._send_cached(request, cacheable, cached, **kwargs)
+            telemetry.record_request(
+                endpoint,
+                resource if token is not None else None,
+                304 if getattr(response, "from_cache", False) else response.status_code,
+                time.monotonic() - started,
+                response.headers,
+            )
+            if token is None:
+                return response
+            token_pool.update(token, resource, response.headers)
+            delay = token_pool.retry_delay(token, response, attempt)
+            if delay is None or attempt == SECONDARY_LIMIT_RETRIES:
+                return response
+            response.close()
+            telemetry.record_retry(endpoint, "rate_limit")
+            telemetry.record_sleep("retry", delay)
+            token_pool.sleep(delay)
+
+    @staticmethod
+    def _lookup(request):
+        """Tell if a request goes through the cache, and get its stored entry.
+
+        The validators of the entry are added to the request.
+        """
+        http_cache = get_http_cache()
+        cacheable = (
+            http_cache is not None
+            and request.method == "GET"
+            and "If-None-Match" not in request.headers
+            and "If-Modified-Since" not in request.headers
+        )
+        if not cacheable:
+            return False, None
+        cached = http_cache.get(_cache_key(request))
+        if cached and cached["etag"]:
+            request.headers["If-None-Match"] = cached["etag"]
+        elif cached and cached["last_modified"]:
+            request.headers["If-Modified-Since"] = cached["last_modified"]
+        return True, cached
+
+    def _send_cached(self, request, cacheable, cached, **kwargs):
+        response = super().send(request, **kwargs)
+        if not cacheable:
+            return response
+        http_cache = get_http_cache()
+        if response.status_code == 304 and cached:
+            http_cache.touch(_cache_key(request))
+            return self._from_cache(response, cached)
+        http_cache.record_miss()
+        validators = (
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        if response.status_code == 200 and any(validators):
+            key = _cache_key(request)
+            headers = {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in _UNCACHED_HEADERS
+            }
+            if kwargs.get("stream"):
+                # the caller reads the body, and hands it back once it is whole
+                response.cache_body = lambda body: http_cache.put(
+                    key, *validators, headers, body
+                )
+            else:
+                http_cache.put(key, *validators, headers, response.content)
+        return response
+
+    @staticmethod
+    def _from_cache(not_modified, cached):
+        """Turn a 304 answer into the 200 response it stands for"""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(cached["headers"])
+        # keep the fresh rate limit headers of the 304
+        response.headers.update(
+            (name, value)
+            for name, value in not_modified.headers.items()
+            if name.lower() not in _UNCACHED_HEADERS
+        )
+        response._content = cached["body"]
+        # iter_content serves the cached body instead of reading a stream
+        response._content_consumed = True
+        response.encoding = not_modified.encoding or "utf-8"
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.connection = not_modified.connection
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        return response
+
+
+def _mount(session, max_retries=0, pool_maxsize=POOL_MAXSIZE):
+    adapter = GithubAdapter(max_retries=max_retries, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _ThreadSafeConnectionMixin:
+    """Keep the pending request per thread and send it through GithubAdapter.
+
+    PyGithub shares one connection object per Requester and stores the pending
+    request on it between request() and getresponse(), so concurrent callers
+    would overwrite each other's requests.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+        _mount(
+            self.session,
+            max_retries=self.adapter.max_retries,
+            pool_maxsize=max(self.adapter._pool_maxsize, POOL_MAXSIZE),
+        )
+
+    def request(self, verb, url, input, headers):
+        self._local.pending = (verb, url, input, headers)
+
+    def getresponse(self):
+        verb, url, input, headers = self._local.pending
+        response = self.session.request(
+            verb,
+            f"{self.protocol}://{self.host}:{self.port}{url}",
+            headers=headers,
+            data=input,
+            timeout=self.timeout,
+            verify=self.verify,
+            allow_redirects=False,
+        )
+        return RequestsResponse(response)
+
+
+class HTTPConnection(_ThreadSafeConnectionMixin, HTTPRequestsConnectionClass):
+    pass
+
+
+class HTTPSConnection(_ThreadSafeConnectionMixin, HTTPSRequestsConnectionClass):
+    pass
+
+
+def get_github(**kwargs):
+    """Create a Github client that is safe to share between threads.
+
+    Its requests are authenticated with the tokens of the shared pool, and go
+    to GITHUB_API_URL unless given a base_url.
+    """
+    Requester.injectConnectionClasses(HTTPConnection, HTTPSConnection)
+    kwargs.setdefault("base_url", GITHUB_API_URL)
+    return Github(token_pool.tokens[0] if token_pool.tokens else None, **kwargs)
+
+
+def new_session():
+    """Create a requests session for GitHub calls made outside of PyGithub"""
+    return _mount(requests.Session())
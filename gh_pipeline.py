@@ -0,0 +1,95 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from checkpoint import mark_page, mark_unit_done, save_records
+from config import WRITE_BATCH_SIZE, WRITE_QUEUE_SIZE
+
+_STOP = object()
+
+
+@dataclass
+class PageDone:
+    """Marks the end of a page: every record of it was queued before this"""
+
+    unit: str
+    page: int
+    on_saved: Optional[Callable[[], None]] = None
+    # the last page of the unit
+    last: bool = False
+
+
+class DbWriter:
+    """Save hydrated repos to the database as they come, on a thread of its own.
+
+    Fetching threads put records on a bounded queue, so memory stays flat and
+    they slow down when the database falls behind. Pages are marked done once
+    all their records are saved, and every saved batch is handed to the
+    listeners, so later stages can start on it while fetching goes on.
+    """
+
+    def __init__(self, listeners=(), batch_size=WRITE_BATCH_SIZE):
+        self.listeners = list(listeners)
+        self.batch_size = batch_size
+        self.saved = 0
+        self.error = None
+        self._closed = False
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def put(self, item):
+        """Queue a record or a PageDone marker, blocking while the queue is full"""
+        if self.error is not None or self._closed:
+            raise RuntimeError("the database writer stopped") from self.error
+        self._queue.put(item)
+
+    def close(self):
+        """Save what is left on the queue and stop the writer"""
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self.error is not None:
+            raise RuntimeError("the database writer stopped") from self.error
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        save_records(batch)
+        self.saved += len(batch)
+        for listener in self.listeners:
+            listener(batch)
+        batch.clear()
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    self._flush(batch)
+                    return
+                if isinstance(item, PageDone):
+                    self._flush(batch)
+                    mark_page(item.unit, item.page, "done")
+                    if item.last:
+                        mark_unit_done(item.unit)
+                    if item.on_saved is not None:
+                        item.on_saved()
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size or self._queue.empty():
+                    self._flush(batch)
+        except BaseException as e:
+            self.error = e
+            # keep draining, so producers blocked on a full queue see the error
+            while self._queue.get() is not _STOP:
+                pass
@@ -1,16 +1,39 @@
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import date, timedelta
 
 from github import GithubException, RateLimitExceededException
-from pyrate_limiter import Duration, Limiter, RequestRate
 from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
 from rich.text import Text
 
-from config import DAYS_AGO, NUM_STARS
-from repo_details import RepoDetails, save_progress
+from checkpoint import mark_page
+from config import (DAYS_AGO, GRAPHQL_BATCH_SIZE, GRAPHQL_FIXTURE_MODE,
+                    GRAPHQL_FIXTURES_DIR, HYDRATION_CONCURRENCY,
+                    HYDRATION_MODE, HYDRATION_SUBREQUESTS,
+                    INCREMENTAL_REFRESH, NUM_STARS)
+from gh_graphql import GraphQLFetcher
+from gh_pipeline import PageDone
+from gh_search import SearchPartition, search_page
+from gh_tokens import token_pool
+from hydration_index import hydration_index
+from repo_details import RepoDetails
+from sql_utils import get_unchanged_repo_ids
 from utils import preprocess_text, print
 
-hourly_rate = RequestRate(5000, Duration.HOUR)
-limiter = Limiter(hourly_rate)
+# shared by every processor, so the caps hold across keywords as well
+repo_executor = ThreadPoolExecutor(max_workers=HYDRATION_CONCURRENCY)
+sub_resource_executor = (
+    ThreadPoolExecutor(max_workers=HYDRATION_SUBREQUESTS)
+    if HYDRATION_SUBREQUESTS > 1
+    else None
+)
+
+
+def hydrate_repo(repo, executor=None):
+    """Get the details of a repo found by a search, the way HYDRATION_MODE says"""
+    if HYDRATION_MODE == "payload":
+        return RepoDetails.from_search_payload(repo, executor)
+    return RepoDetails(repo, executor)
 
 
 def progress_with_checkmark(progress):
@@ -21,26 +44,54 @@ def progress_with_checkmark(progress):
         return Text("✔", style="bold green")
 
 
+def make_progress():
+    return Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(bar_width=5),
+        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+        TimeElapsedColumn(),
+    )
+
+
 class RepoProcessor:
-    def __init__(self, gh_instance, keyword, start_page=0, max_retries=6):
+    def __init__(
+        self,
+        gh_instance,
+        keyword,
+        writer,
+        start_page=0,
+        max_retries=6,
+        progress=None,
+        partition=None,
+    ):
         self.gh = gh_instance
         self.keyword = keyword
+        self.partition = partition or SearchPartition(
+            keyword, NUM_STARS, date.today() - timedelta(days=DAYS_AGO)
+        )
         self.start_page = start_page
         self.max_retries = max_retries
-        self.filtered_repos = []
-        self.processed_urls = {}
-
-        self.limiter = Limiter(
-            RequestRate(30, Duration.MINUTE),
-            RequestRate(1000, Duration.HOUR),
+        self.progress = progress
+        # a DbWriter, every hydrated repo is streamed to it
+        self.writer = writer
+        self.num_processed = 0
+        self.processed_urls = set()
+        self.graphql = (
+            GraphQLFetcher(
+                batch_size=GRAPHQL_BATCH_SIZE,
+                mode=GRAPHQL_FIXTURE_MODE,
+                fixtures_dir=GRAPHQL_FIXTURES_DIR,
+            )
+            if HYDRATION_MODE == "graphql"
+            else None
         )
 
-    @limiter.ratelimit("github", delay=True)
-    def search_repos_by_readme(self, keyword, num_stars, days_ago, page):
-        query = f'"{keyword}" in:readme stars:>={num_stars} pushed:{(datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")}..*'
-        return self.gh.search_repositories(
-            query=query, sort="updated", order="desc"
-        ).get_page(page)
+    def search_repos_by_readme(self, page):
+        if page == 0 and self.partition.first_page is not None:
+            # already fetched while planning the partitions
+            first_page, self.partition.first_page = self.partition.first_page, None
+            return first_page
+        return search_page(self.gh, self.partition, page)
 
     def _fetch_repo_details(self, repo):
         repo_url = repo.html_url
@@ -48,77 +99,194 @@ class RepoProcessor:
             pass
             # self.processed_urls[repo_url].additional_keywords.append(self.keyword)
         else:
-            repo_details = RepoDetails(repo)
-            repo_details.keyword = self.keyword
-            repo_details.additional_keywords = (
-                ""
-                if self.processed_urls.get(repo_url) is None
-                else "|".join(self.processed_urls[repo_url].additional_keywords)
-            )
+            return self._tag_repo_details(hydrate_repo(repo))
+
+    def _tag_repo_details(self, repo_details):
+        repo_details.keyword = self.keyword
+        # other keywords are merged in by save_results_to_db
+        repo_details.additional_keywords = ""
+        if not repo_details.refresh_only:
             repo_details.readme = preprocess_text(repo_details.readme)
-            self.processed_urls[repo_url] = repo_details
-            return repo_details
+        # every field is fetched, let go of the PyGithub object
+        repo_details.repo = None
+        self.processed_urls.add(repo_details.url)
+        return repo_details
 
-    def fetch_repos_details(self, gh_repos, task, progress, page):
-        all_repos_details = []
+    def _hydrate_page(self, gh_repos):
+        """Yield the details of the repos on a page not processed yet"""
+        gh_repos = yield from self._skip_hydrated(gh_repos)
+        if INCREMENTAL_REFRESH:
+            gh_repos = yield from self._refresh_unchanged(gh_repos)
+        if HYDRATION_MODE == "graphql":
+            new_repos = [
+                repo for repo in gh_repos if repo.html_url not in self.processed_urls
+            ]
+            for repo_details in self.graphql.fetch_page(new_repos):
+                yield self._tag_repo_details(repo_details)
+        elif HYDRATION_CONCURRENCY > 1:
+            yield from self._hydrate_page_concurrently(gh_repos)
+        else:
+            for repo in gh_repos:
+                repo_details = self._fetch_repo_details(repo)
+                if repo_details:
+                    yield repo_details
+
+    def _skip_hydrated(self, gh_repos):
+        """Yield keyword-only records for repos hydrated by another unit or run.
+
+        Returns the repos claimed by this processor, which it has to hydrate.
+        """
+        claimed, seen = [], set()
+        for repo in gh_repos:
+            if repo.html_url in self.processed_urls or repo.id in seen:
+                continue
+            seen.add(repo.id)
+            if hydration_index.claim(repo.id, self):
+                claimed.append(repo)
+            else:
+                # no GitHub calls, the search payload carries the counters
+                yield self._tag_repo_details(
+                    RepoDetails.from_search_payload(repo, refresh_only=True)
+                )
+        return claimed
+
+    def _refresh_unchanged(self, gh_repos):
+        """Yield counter-only records for stored repos not pushed to since.
+
+        Returns the repos that still need to be hydrated. updated_at is not
+        compared, GitHub bumps it on every new star.
+        """
+        unchanged_ids = get_unchanged_repo_ids(
+            {repo.id: repo._rawData["pushed_at"] for repo in gh_repos}
+        )
+        changed_repos = []
         for repo in gh_repos:
-            repo_details = self._fetch_repo_details(repo)
-            if repo_details:
-                all_repos_details.append(repo_details)
-                progress.update(task, advance=1)
-                progress.update(
-                    task,
-                    description=(
-                        f"processing repos with keyword: '{self.keyword.center(35)}' on page '{page}'"
-                        f" | {len(self.filtered_repos) + len(all_repos_details):^3} repos processed"
-                    ),
+            if repo.id not in unchanged_ids:
+                changed_repos.append(repo)
+            elif repo.html_url not in self.processed_urls:
+                yield self._tag_repo_details(
+                    RepoDetails.from_search_payload(repo, refresh_only=True)
                 )
+        return changed_repos
+
+    def _hydrate_page_concurrently(self, gh_repos):
+        """Yield the details of the repos on a page as soon as each one is hydrated"""
+        futures = {}
+        for repo in gh_repos:
+            if repo.html_url in self.processed_urls:
+                continue
+            # claim the url right away, so duplicates on the page are skipped
+            self.processed_urls.add(repo.html_url)
+            futures[
+                repo_executor.submit(hydrate_repo, repo, sub_resource_executor)
+            ] = repo.html_url
+        try:
+            for future in as_completed(futures):
+                repo_details = future.result()
+                del futures[future]
+                yield self._tag_repo_details(repo_details)
+        finally:
+            # release the urls that were not hydrated, so a retried page fetches them
+            for future, repo_url in futures.items():
+                future.cancel()
+                self.processed_urls.discard(repo_url)
+
+    def fetch_repos_details(self, gh_repos, task, progress, page):
+        """Stream the details of the repos on a page to the writer.
+
+        Returns the ids of the repos written.
+        """
+        repo_ids = []
+        for repo_details in self._hydrate_page(gh_repos):
+            self.writer.put(repo_details)
+            repo_ids.append(repo_details.id)
+            self.num_processed += 1
+            progress.update(task, advance=1)
+            progress.update(
+                task,
+                description=(
+                    f"processing repos with keyword: '{self.keyword.center(35)}' on page '{page}'"
+                    f" | {self.num_processed:^3} repos processed"
+                ),
+            )
 
-        return all_repos_details
+        return repo_ids
 
     def fetch_filtered_repos(self):
+        """Fetch the pages of the partition, streaming the repos to the writer.
+
+        Every page is checkpointed once the writer saved it, so an interrupted
+        run resumes from the first page that is not done. Returns the number of
+        repos processed.
+        """
+        unit = self.partition.query()
         page = self.start_page
         break_no = 0
         while True:
             try:
-                gh_repos = self.search_repos_by_readme(
-                    self.keyword, NUM_STARS, DAYS_AGO, page
-                )
+                mark_page(unit, page, "in_progress")
+                gh_repos = self.search_repos_by_readme(page)
                 if not gh_repos:
+                    self.writer.put(PageDone(unit, page, last=True))
                     break
 
-                with Progress(
-                    TextColumn("[progress.description]{task.description}"),
-                    BarColumn(bar_width=5),
-                    TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-                    TimeElapsedColumn(),
+                # a progress shared between keywords is owned by the caller
+                with (
+                    nullcontext(self.progress)
+                    if self.progress is not None
+                    else make_progress()
                 ) as progress:
                     task = progress.add_task(
                         description=(
                             f"processing repos with keyword: '{self.keyword.center(35)}' on page '{page}'"
-                            f" | {len(self.filtered_repos):^3} repos processed"
+                            f" | {self.num_processed:^3} repos processed"
                         ),
                         total=len(gh_repos),
                     )
 
-                    filtered_repos_page = self.fetch_repos_details(
-                        gh_repos, task, progress, page
-                    )
-                    self.filtered_repos.extend(filtered_repos_page)
+                    try:
+                        repo_ids = self.fetch_repos_details(
+                            gh_repos, task, progress, page
+                        )
+                    except BaseException:
+                        # the page is not done, a retry hydrates it again
+                        hydration_index.release([repo.id for repo in gh_repos], self)
+                        for repo in gh_repos:
+                            self.processed_urls.discard(repo.html_url)
+                        raise
+                    if self.progress is not None:
+                        progress.remove_task(task)
 
-                save_progress(self.keyword, page)
+                last = (
+                    self.partition.total_count is not None
+                    and page + 1 >= self.partition.num_pages
+                )
+                self.writer.put(
+                    PageDone(
+                        unit,
+                        page,
+                        on_saved=lambda repo_ids=repo_ids: hydration_index.confirm(
+                            repo_ids, self
+                        ),
+                        last=last,
+                    )
+                )
                 page += 1
+                if last:
+                    break
             except RateLimitExceededException as e:
-                print("rate limit exceeded, time to reset:", e.reset)
-                save_progress(self.keyword, page)
+                mark_page(unit, page, "pending")
+                print("rate limit exceeded, waiting for the reset...")
+                token_pool.wait_for_reset("search", e.headers)
             except GithubException as e:
                 print(
-                    f"An error occurred while processing the keyword '{self.keyword}' on page {page}: {e}"
+                    f"An error occurred while processing the query '{unit}' on page {page}: {e}"
                 )
-                save_progress(self.keyword, page)
+                # left pending, so the next run retries the page
+                mark_page(unit, page, "pending")
                 if break_no == 0:
                     break_no = 1
                     continue
                 else:
                     break
-        return self.filtered_repos
+        return self.num_processed
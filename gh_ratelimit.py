@@ -0,0 +1,140 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+from gh_telemetry import telemetry
+
+# length of the rate limit window of each resource, in seconds
+WINDOWS = {"core": 3600, "search": 60, "graphql": 3600}
+# hosts serving plain files, which are not metered by the API rate limits
+UNMETERED_HOSTS = {"raw.githubusercontent.com"}
+SECONDARY_LIMIT_WAIT = 60
+
+
+def resource_for(url):
+    """Get the rate limit resource a request to url is counted against"""
+    parts = urlsplit(url)
+    if parts.hostname in UNMETERED_HOSTS:
+        return None
+    if parts.path.rstrip("/").endswith("/graphql"):
+        return "graphql"
+    if "/search/" in parts.path:
+        return "search"
+    return "core"
+
+
+class _Budget:
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.next_slot = 0.0
+
+
+class AdaptiveRateLimiter:
+    """Pace GitHub requests from the rate limit headers of the responses.
+
+    Every resource (core, search, graphql) has its own budget. Requests are
+    spread evenly over what is left of the window, and once the budget is spent
+    callers sleep until the reset time GitHub reported.
+    """
+
+    def __init__(self, pace=True):
+        self.pace = pace
+        self.slept = 0.0
+        self._budgets = {resource: _Budget() for resource in WINDOWS}
+        self._lock = threading.Lock()
+
+    def budget(self, resource):
+        if resource not in self._budgets:
+            self._budgets[resource] = _Budget()
+        return self._budgets[resource]
+
+    def reserve(self, resource):
+        """Claim a request slot and return how long to wait before sending it"""
+        with self._lock:
+            budget = self.budget(resource)
+            if budget.remaining is None or budget.reset is None:
+                return 0.0
+            now = time.time()
+            if budget.remaining <= 0:
+                # the next window opens at the reported reset time
+                budget.next_slot = max(budget.next_slot, budget.reset + 1)
+                budget.reset = max(budget.reset, now) + WINDOWS.get(resource, 3600)
+                budget.remaining = budget.limit or 1
+            slot = max(now, budget.next_slot)
+            if self.pace:
+                window_left = max(budget.reset - slot, 0)
+                budget.next_slot = slot + window_left / budget.remaining
+            budget.remaining -= 1
+            return slot - now
+
+    def available_at(self, resource):
+        """Get when a request against resource may be sent next, and the budget left"""
+        with self._lock:
+            budget = self.budget(resource)
+            if budget.remaining is None or budget.reset is None:
+                # nothing known yet, so the whole budget is there
+                return 0.0, float("inf")
+            if budget.remaining <= 0:
+                return max(budget.next_slot, budget.reset + 1), 0
+            return budget.next_slot, budget.remaining
+
+    def acquire(self, resource):
+        """Wait until a request against resource may be sent"""
+        delay = self.reserve(resource)
+        if delay > 0:
+            self.sleep(delay)
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.slept += seconds
+        telemetry.record_sleep("pacing", seconds)
+        time.sleep(seconds)
+
+    def update(self, resource, headers):
+        """Record the budget reported by the rate limit headers of a response.
+
+        Returns the resource the response was counted against.
+        """
+        # PyGithub hands over lower-cased header names
+        headers = {name.lower(): value for name, value in headers.items()}
+        if "x-ratelimit-remaining" not in headers:
+            return resource
+        resource = headers.get("x-ratelimit-resource", resource)
+        with self._lock:
+            budget = self.budget(resource)
+            reset = float(headers["x-ratelimit-reset"])
+            remaining = int(headers["x-ratelimit-remaining"])
+            budget.limit = int(headers.get("x-ratelimit-limit", budget.limit or 0))
+            if budget.remaining is None or budget.reset is None or reset > budget.reset:
+                budget.remaining = remaining
+            else:
+                # responses of parallel requests arrive out of order
+                budget.remaining = min(budget.remaining, remaining)
+            budget.reset = max(reset, budget.reset or 0)
+        return resource
+
+    def retry_delay(self, response, attempt):
+        """Get how long to wait before retrying a rate limited response, or None"""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            return float(retry_after)
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = float(response.headers["X-RateLimit-Reset"])
+            return max(reset - time.time(), 0) + 1
+        if "secondary rate limit" in response.text.lower():
+            return SECONDARY_LIMIT_WAIT * 2**attempt
+        return None
+
+    def wait_for_reset(self, resource, headers=None):
+        """Sleep until the budget of resource is restored"""
+        if headers:
+            resource = self.update(resource, headers)
+        with self._lock:
+            budget = self.budget(resource)
+            delay = (budget.reset or time.time()) - time.time() + 1
+        if delay > 0:
+            self.sleep(delay)
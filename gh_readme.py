@@ -0,0 +1,89 @@
+from config import README_MAX_BYTES, README_RAW_HOST, README_SOURCE
+from gh_http import new_session
+
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+# tried in order on the raw content host, which has no readme lookup of its own
+README_FILENAMES = [
+    "README.md",
+    "readme.md",
+    "Readme.md",
+    "README.rst",
+    "README.txt",
+    "README",
+]
+CHUNK_SIZE = 64 * 1024
+
+_session = new_session()
+
+
+def _read_capped(response, max_bytes):
+    """Read a streamed response up to max_bytes, and tell if it was cut short.
+
+    A readme read in full goes to the http cache, so the next run revalidates
+    it with its ETag. One cut short is not cached, the stored copy would be
+    wrong once README_MAX_BYTES grows.
+    """
+    chunks, size = [], 0
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            # one byte past the cap tells a truncated readme from one that fits
+            if size > max_bytes:
+                break
+    finally:
+        response.close()
+    body = b"".join(chunks)
+    truncated = size > max_bytes
+    if not truncated and hasattr(response, "cache_body"):
+        response.cache_body(body)
+    # a multi-byte character cut at the cap is dropped
+    text = body[:max_bytes].decode("utf-8", errors="ignore")
+    return text, truncated
+
+
+def _fetch_from_api(repo, max_bytes):
+    response = _session.get(
+        f"{repo.url}/readme",
+        headers={"Accept": RAW_MEDIA_TYPE},
+        stream=True,
+        timeout=60,
+    )
+    if response.status_code == 404:
+        response.close()
+        return None, False
+    response.raise_for_status()
+    return _read_capped(response, max_bytes)
+
+
+def _fetch_from_raw_host(repo, max_bytes):
+    for filename in README_FILENAMES:
+        response = _session.get(
+            f"{README_RAW_HOST}/{repo.full_name}/HEAD/{filename}",
+            stream=True,
+            timeout=60,
+        )
+        if response.status_code == 404:
+            response.close()
+            continue
+        response.raise_for_status()
+        return _read_capped(response, max_bytes)
+    return None, False
+
+
+def fetch_readme(repo, max_bytes=README_MAX_BYTES, source=README_SOURCE):
+    """Get the readme of a repo as text, at most max_bytes of it.
+
+    source is one of:
+        raw      - the readme endpoint with the raw media type, no base64 envelope
+        raw_host - the raw content host, which is not metered by the API rate
+                   limits; falls back to raw for readmes under other names
+
+    Returns the text, None when the repo has no readme, and whether the
+    readme was truncated at max_bytes.
+    """
+    if source == "raw_host":
+        readme, truncated = _fetch_from_raw_host(repo, max_bytes)
+        if readme is not None:
+            return readme, truncated
+    return _fetch_from_api(repo, max_bytes)
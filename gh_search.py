@@ -0,0 +1,114 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional
+
+from config import SEARCH_PER_PAGE
+
+# GitHub search never returns more than this many results for a query
+SEARCH_RESULT_CAP = 1000
+
+
+@dataclass
+class SearchPartition:
+    """A readme search for keyword over a range of stars and push dates"""
+
+    keyword: str
+    min_stars: int
+    pushed_from: date
+    max_stars: Optional[int] = None
+    pushed_to: Optional[date] = None
+    total_count: Optional[int] = None
+    first_page: Optional[List] = field(default=None, repr=False)
+
+    def query(self):
+        stars = (
+            f">={self.min_stars}"
+            if self.max_stars is None
+            else f"{self.min_stars}..{self.max_stars}"
+        )
+        pushed_to = "*" if self.pushed_to is None else self.pushed_to.isoformat()
+        return (
+            f'"{self.keyword}" in:readme stars:{stars} '
+            f"pushed:{self.pushed_from.isoformat()}..{pushed_to}"
+        )
+
+    @property
+    def num_pages(self):
+        return -(-min(self.total_count, SEARCH_RESULT_CAP) // SEARCH_PER_PAGE)
+
+    def split(self):
+        """Split into two disjoint partitions, or None if it cannot be narrowed"""
+        pushed_to = self.pushed_to or date.today()
+        if pushed_to > self.pushed_from:
+            middle = self.pushed_from + (pushed_to - self.pushed_from) // 2
+            return [
+                SearchPartition(
+                    self.keyword,
+                    self.min_stars,
+                    self.pushed_from,
+                    self.max_stars,
+                    middle,
+                ),
+                SearchPartition(
+                    self.keyword,
+                    self.min_stars,
+                    middle + timedelta(days=1),
+                    self.max_stars,
+                    self.pushed_to,
+                ),
+            ]
+        if self.max_stars is None:
+            # star counts are heavy tailed, so split the open range geometrically
+            middle = max(self.min_stars * 2, self.min_stars + 1)
+        elif self.max_stars > self.min_stars:
+            middle = (self.min_stars + self.max_stars) // 2
+        else:
+            return None
+        return [
+            SearchPartition(
+                self.keyword, self.min_stars, self.pushed_from, middle, self.pushed_to
+            ),
+            SearchPartition(
+                self.keyword,
+                middle + 1,
+                self.pushed_from,
+                self.max_stars,
+                self.pushed_to,
+            ),
+        ]
+
+
+def search_page(gh_instance, partition, page):
+    return gh_instance.search_repositories(
+        query=partition.query(), sort="updated", order="desc"
+    ).get_page(page)
+
+
+def plan_partitions(gh_instance, keyword, num_stars, days_ago):
+    """Split the search for keyword into partitions under the search result cap.
+
+    The first page of every partition is fetched while probing its total
+    count, and kept on the partition so it is not searched for again.
+    """
+    pending = [
+        SearchPartition(keyword, num_stars, date.today() - timedelta(days=days_ago))
+    ]
+    partitions = []
+    while pending:
+        partition = pending.pop()
+        results = gh_instance.search_repositories(
+            query=partition.query(), sort="updated", order="desc"
+        )
+        partition.first_page = results.get_page(0)
+        partition.total_count = results.totalCount
+        if partition.total_count <= SEARCH_RESULT_CAP:
+            partitions.append(partition)
+            continue
+        halves = partition.split()
+        if halves is None:
+            # a single star count on a single day, keep the first 1000 results
+            partitions.append(partition)
+        else:
+            partition.first_page = None
+            pending.extend(halves)
+    return partitions
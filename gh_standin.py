@@ -0,0 +1,668 @@
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import typer
+
+app = typer.Typer()
+# the rate limits of an authenticated user, and the length of their windows
+LIMITS = {"core": 5000, "search": 30, "graphql": 5000}
+WINDOWS = {"core": 3600, "search": 60, "graphql": 3600}
+SEARCH_RESULT_CAP = 1000
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+LICENSES = {
+    "mit": "MIT License",
+    "apache-2.0": "Apache License 2.0",
+    "bsd-3-clause": 'BSD 3-Clause "New" or "Revised" License',
+    "gpl-3.0": "GNU General Public License v3.0",
+    "other": "Other",
+}
+LANGUAGES = ["Python", "C++", "C", "CUDA", "Jupyter Notebook", "CMake", "Shell"]
+WORDS = (
+    "fast kernel library toolkit model inference training compiler runtime "
+    "parallel vector matrix tensor graph sample benchmark device memory"
+).split()
+
+
+def _timestamp(value):
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+class Corpus:
+    """The repos served by the stand-in, synthetic or loaded from a file"""
+
+    def __init__(self, repos):
+        self.repos = repos
+        self.by_name = {repo["full_name"]: repo for repo in repos}
+        self.by_node_id = {repo["node_id"]: repo for repo in repos}
+
+    @classmethod
+    def synthetic(cls, num_repos, keywords, seed=0):
+        rng = random.Random(seed)
+        now = datetime.utcnow().replace(microsecond=0)
+        repos = []
+        for i in range(num_repos):
+            created_at = now - timedelta(days=rng.randint(30, 3000))
+            pushed_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            matched = rng.sample(keywords, k=min(len(keywords), rng.randint(1, 2)))
+            # a few megabyte readmes, as some repos have
+            num_words = rng.randint(50, 400) if rng.random() > 0.01 else 200000
+            words = " ".join(rng.choice(WORDS) for _ in range(num_words))
+            license_key = rng.choice([None, *LICENSES])
+            repos.append(
+                {
+                    "id": 100000 + i,
+                    "full_name": f"standin-org-{i % 50}/repo-{i}",
+                    "node_id": f"R_standin{100000 + i}",
+                    "description": f"{' '.join(matched)} {rng.choice(WORDS)} project",
+                    "fork": rng.random() < 0.1,
+                    "size": rng.randint(10, 500000),
+                    # star counts are heavy tailed
+                    "stargazers_count": int(rng.paretovariate(1.2) * 20),
+                    "forks_count": rng.randint(0, 500),
+                    "created_at": _timestamp(created_at),
+                    "pushed_at": _timestamp(pushed_at),
+                    "updated_at": _timestamp(
+                        max(pushed_at, now - timedelta(minutes=rng.randint(0, 600)))
+                    ),
+                    "language": rng.choice(LANGUAGES),
+                    "languages": {
+                        language: rng.randint(1000, 2000000)
+                        for language in rng.sample(LANGUAGES, k=rng.randint(1, 4))
+                    },
+                    "topics": rng.sample(WORDS, k=rng.randint(0, 5)),
+                    "license": license_key,
+                    "readme": f"# repo-{i}\n\n{' '.join(matched)} {words}\n",
+                    "open_issues": rng.randint(0, 200),
+                    "closed_issues": rng.randint(0, 1000),
+                    "open_pulls": rng.randint(0, 30),
+                    "closed_pulls": rng.randint(0, 300),
+                    "contributors": rng.randint(1, 120),
+                }
+            )
+        return cls(repos)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as corpus_file:
+            return cls(json.load(corpus_file))
+
+    def dump(self, path):
+        with open(path, "w") as corpus_file:
+            json.dump(self.repos, corpus_file)
+
+    def search(self, query):
+        """Get the repos matching a readme search query, most recently updated first"""
+        keyword = re.search(r'"([^"]+)"', query) or re.match(r"(\S+)", query)
+        keyword = keyword.group(1).lower() if keyword else ""
+        min_stars, max_stars = 0, None
+        stars = re.search(r"stars:(?:>=(\d+)|(\d+)\.\.(\d+|\*))", query)
+        if stars and stars.group(1):
+            min_stars = int(stars.group(1))
+        elif stars:
+            min_stars = int(stars.group(2))
+            max_stars = None if stars.group(3) == "*" else int(stars.group(3))
+        pushed_from, pushed_to = "", "9999"
+        pushed = re.search(r"pushed:(?:>=(\S+)|(\S+)\.\.(\S+))", query)
+        if pushed and pushed.group(1):
+            pushed_from = pushed.group(1)
+        elif pushed:
+            pushed_from = pushed.group(2)
+            pushed_to = "9999" if pushed.group(3) == "*" else pushed.group(3)
+        found = [
+            repo
+            for repo in self.repos
+            if keyword in repo["readme"].lower()
+            and repo["stargazers_count"] >= min_stars
+            and (max_stars is None or repo["stargazers_count"] <= max_stars)
+            and pushed_from <= repo["pushed_at"][:10] <= pushed_to
+        ]
+        return sorted(found, key=lambda repo: repo["updated_at"], reverse=True)
+
+
+class _Budget:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = time.time() + window
+
+    def headers(self, resource):
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(self.reset)),
+            "X-RateLimit-Used": str(self.limit - self.remaining),
+            "X-RateLimit-Resource": resource,
+        }
+
+
+class StandinServer:
+    """A local stand-in for the part of the GitHub API this project uses.
+
+    It serves a Corpus with the rate limit headers of GitHub, answers 403 once
+    a budget is spent, throws in secondary rate limits at secondary_rate, and
+    waits latency (plus up to jitter) seconds before every answer. ETags are
+    honoured, and 304 answers do not count against the budgets.
+    """
+
+    def __init__(
+        self,
+        corpus,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        secondary_rate=0.0,
+        retry_after=1,
+        limits=None,
+        windows=None,
+        seed=0,
+    ):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.secondary_rate = secondary_rate
+        self.retry_after = retry_after
+        self.limits = {**LIMITS, **(limits or {})}
+        self.windows = {**WINDOWS, **(windows or {})}
+        self.gists = {}
+        self._budgets = {}
+        self._requests = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        """Get the number of requests served, by route and by status"""
+        with self._lock:
+            routes, statuses = Counter(), Counter()
+            for (route, status), count in self._requests.items():
+                routes[route] += count
+                statuses[str(status)] += count
+            return {
+                "total": sum(routes.values()),
+                "routes": dict(routes),
+                "statuses": dict(statuses),
+            }
+
+    def reset(self):
+        """Forget the requests served and restore every budget"""
+        with self._lock:
+            self._requests.clear()
+            self._budgets.clear()
+
+    def record(self, route, status):
+        with self._lock:
+            self._requests[route, status] += 1
+
+    def budget(self, token, resource):
+        """Get the budget of token on resource, opening a new window when due"""
+        with self._lock:
+            key = (token, resource)
+            budget = self._budgets.get(key)
+            if budget is None or time.time() >= budget.reset:
+                budget = self._budgets[key] = _Budget(
+                    self.limits[resource], self.windows[resource]
+                )
+            return budget
+
+    def spend(self, token, resource):
+        """Count a request against the budget, False if there is none left"""
+        budget = self.budget(token, resource)
+        with self._lock:
+            if budget.remaining <= 0:
+                return False
+            budget.remaining -= 1
+            return True
+
+    def secondary_limited(self):
+        with self._lock:
+            return self._random.random() < self.secondary_rate
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter)
+        if self.latency or jitter:
+            time.sleep(self.latency + jitter)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("GET", r"/rate_limit", "rate_limit"),
+        ("GET", r"/search/repositories", "search"),
+        ("POST", r"/graphql", "graphql"),
+        ("POST", r"/gists", "create_gist"),
+        ("GET", r"/gists/(?P<gist_id>[^/]+)", "gist"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)", "repo"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/readme", "readme"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/license", "license"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/languages", "languages"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/topics", "topics"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/issues", "issues"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/contributors", "contributors"),
+        ("GET", r"/repos/(?P<name>[^/]+/[^/]+)/pulls", "pulls"),
+        # the raw content host, point README_RAW_HOST at {url}/raw
+        ("GET", r"/raw/(?P<name>[^/]+/[^/]+)/[^/]+/(?P<filename>.+)", "raw"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def standin(self):
+        return self.server.standin
+
+    @property
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        parts = urlsplit(self.path)
+        self.query = {
+            name: values[-1] for name, values in parse_qs(parts.query).items()
+        }
+        # GitHub Enterprise style base urls put the API under /api/v3
+        path = re.sub(r"^/api/v3", "", parts.path).rstrip("/") or "/"
+        if path == "/_standin/stats":
+            return self._send(200, self.standin.stats(), metered=False)
+        if path == "/_standin/reset":
+            self.standin.reset()
+            return self._send(204, None, metered=False)
+        for route_method, pattern, route in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                self.route = route
+                self.body = self._read_body()
+                self.standin.delay()
+                return getattr(self, f"_{route}")(**match.groupdict())
+        self.route = "unknown"
+        self._send(404, {"message": "Not Found"}, metered=False)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _resource(self):
+        if self.route == "raw":
+            return None
+        if self.route == "graphql":
+            return "graphql"
+        if self.route == "search":
+            return "search"
+        return "core"
+
+    def _send(self, status, payload, headers=None, metered=True):
+        token = self.headers.get("Authorization", self.client_address[0])
+        resource = self._resource() if metered else None
+        headers = dict(headers or {})
+        if status == 204:
+            body = b""
+        elif isinstance(payload, bytes):
+            body = payload
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        metered = metered and resource is not None
+        if metered and self.standin.secondary_limited():
+            status, headers = 403, {"Retry-After": str(self.standin.retry_after)}
+            body = json.dumps(
+                {"message": "You have exceeded a secondary rate limit."}
+            ).encode("utf-8")
+        elif metered and status == 200 and self.command == "GET":
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+        if metered and status not in (304, 403):
+            if not self.standin.spend(token, resource):
+                status, body = 403, json.dumps(
+                    {"message": "API rate limit exceeded."}
+                ).encode("utf-8")
+        if metered:
+            headers.update(self.standin.budget(token, resource).headers(resource))
+        self.standin.record(getattr(self, "route", "unknown"), status)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_page(self, items, path):
+        """Send a page of a listing, with the Link header PyGithub paginates on"""
+        per_page = int(self.query.get("per_page", 30))
+        page = int(self.query.get("page", 1))
+        last = max(-(-len(items) // per_page), 1)
+        links = []
+        for rel, number in (("next", page + 1), ("last", last)):
+            if page < last:
+                query = urlencode({**self.query, "page": number})
+                links.append(f'<{self.base_url}{path}?{query}>; rel="{rel}"')
+        headers = {"Link": ", ".join(links)} if links else None
+        self._send(200, items[(page - 1) * per_page : page * per_page], headers)
+
+    def _repo_or_404(self, name):
+        repo = self.standin.corpus.by_name.get(name)
+        if repo is None:
+            self._send(404, {"message": "Not Found"})
+        return repo
+
+    def _repo_payload(self, repo):
+        owner, name = repo["full_name"].split("/")
+        license_key = repo["license"]
+        return {
+            "id": repo["id"],
+            "node_id": repo["node_id"],
+            "name": name,
+            "full_name": repo["full_name"],
+            "owner": {
+                "login": owner,
+                "id": int(hashlib.sha1(owner.encode("utf-8")).hexdigest()[:6], 16),
+                "type": "Organization",
+            },
+            "private": False,
+            "html_url": f"https://github.com/{repo['full_name']}",
+            "url": f"{self.base_url}/repos/{repo['full_name']}",
+            "description": repo["description"],
+            "fork": repo["fork"],
+            "created_at": repo["created_at"],
+            "updated_at": repo["updated_at"],
+            "pushed_at": repo["pushed_at"],
+            "size": repo["size"],
+            "stargazers_count": repo["stargazers_count"],
+            "watchers_count": repo["stargazers_count"],
+            "forks_count": repo["forks_count"],
+            "language": repo["language"],
+            # GitHub counts open pull requests as open issues
+            "open_issues_count": repo["open_issues"] + repo["open_pulls"],
+            "topics": repo["topics"],
+            "default_branch": "main",
+            "license": license_key
+            and {
+                "key": license_key,
+                "name": LICENSES[license_key],
+                "spdx_id": license_key.upper(),
+                "url": None,
+                "node_id": f"L_{license_key}",
+            },
+        }
+
+    def _content_payload(self, repo, name, text):
+        path = f"{self.base_url}/repos/{repo['full_name']}/contents/{name}"
+        return {
+            "type": "file",
+            "encoding": "base64",
+            "name": name,
+            "path": name,
+            "size": len(text.encode("utf-8")),
+            "sha": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+            "url": path,
+            "html_url": f"https://github.com/{repo['full_name']}/blob/main/{name}",
+            "download_url": None,
+            "content": base64.b64encode(text.encode("utf-8")).decode("ascii"),
+        }
+
+    def _rate_limit(self):
+        token = self.headers.get("Authorization", self.client_address[0])
+        resources = {}
+        for resource in LIMITS:
+            budget = self.standin.budget(token, resource)
+            resources[resource] = {
+                "limit": budget.limit,
+                "remaining": budget.remaining,
+                "reset": int(budget.reset),
+                "used": budget.limit - budget.remaining,
+            }
+        self._send(
+            200, {"resources": resources, "rate": resources["core"]}, metered=False
+        )
+
+    def _search(self):
+        found = self.standin.corpus.search(self.query.get("q", ""))
+        per_page = int(self.query.get("per_page", 30))
+        page = int(self.query.get("page", 1))
+        if (page - 1) * per_page >= SEARCH_RESULT_CAP:
+            return self._send(
+                422, {"message": "Only the first 1000 search results are available"}
+            )
+        items = found[:SEARCH_RESULT_CAP][(page - 1) * per_page : page * per_page]
+        self._send(
+            200,
+            {
+                "total_count": len(found),
+                "incomplete_results": False,
+                "items": [self._repo_payload(repo) for repo in items],
+            },
+        )
+
+    def _repo(self, name):
+        repo = self._repo_or_404(name)
+        if repo is not None:
+            self._send(200, self._repo_payload(repo))
+
+    def _readme(self, name):
+        repo = self._repo_or_404(name)
+        if repo is None:
+            return
+        if self.headers.get("Accept") == "application/vnd.github.raw":
+            return self._send(200, repo["readme"].encode("utf-8"))
+        self._send(200, self._content_payload(repo, "README.md", repo["readme"]))
+
+    def _raw(self, name, filename):
+        repo = self.standin.corpus.by_name.get(name)
+        if repo is None or filename != "README.md":
+            return self._send(404, b"404: Not Found")
+        self._send(200, repo["readme"].encode("utf-8"))
+
+    def _license(self, name):
+        repo = self._repo_or_404(name)
+        if repo is None:
+            return
+        if repo["license"] is None:
+            return self._send(404, {"message": "Not Found"})
+        payload = self._content_payload(
+            repo, "LICENSE", f"{LICENSES[repo['license']]}\n\nPermission is granted."
+        )
+        payload["license"] = self._repo_payload(repo)["license"]
+        self._send(200, payload)
+
+    def _languages(self, name):
+        repo = self._repo_or_404(name)
+        if repo is not None:
+            self._send(200, repo["languages"])
+
+    def _topics(self, name):
+        repo = self._repo_or_404(name)
+        if repo is not None:
+            self._send(200, {"names": repo["topics"]})
+
+    def _issues(self, name):
+        repo = self._repo_or_404(name)
+        if repo is None:
+            return
+        state = self.query.get("state", "open")
+        # the issues endpoint lists pull requests as well
+        counts = {
+            "open": repo["open_issues"] + repo["open_pulls"],
+            "closed": repo["closed_issues"] + repo["closed_pulls"],
+        }
+        total = counts["open"] + counts["closed"] if state == "all" else counts[state]
+        issues = [
+            {"id": repo["id"] * 10000 + number, "number": number, "state": state}
+            for number in range(1, total + 1)
+        ]
+        self._send_page(issues, f"/repos/{name}/issues")
+
+    def _contributors(self, name):
+        repo = self._repo_or_404(name)
+        if repo is not None:
+            contributors = [
+                {"login": f"contributor-{number}", "id": number, "contributions": 1}
+                for number in range(1, repo["contributors"] + 1)
+            ]
+            self._send_page(contributors, f"/repos/{name}/contributors")
+
+    def _pulls(self, name):
+        repo = self._repo_or_404(name)
+        if repo is None:
+            return
+        state = self.query.get("state", "open")
+        counts = {"open": repo["open_pulls"], "closed": repo["closed_pulls"]}
+        total = counts["open"] + counts["closed"] if state == "all" else counts[state]
+        pulls = [
+            {"id": repo["id"] * 10000 + number, "number": number, "state": state}
+            for number in range(1, total + 1)
+        ]
+        self._send_page(pulls, f"/repos/{name}/pulls")
+
+    def _create_gist(self):
+        gist_id = hashlib.sha1(
+            json.dumps(self.body, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:20]
+        gist = {
+            "id": gist_id,
+            "url": f"{self.base_url}/gists/{gist_id}",
+            "html_url": f"https://gist.github.com/{gist_id}",
+            "description": self.body.get("description", ""),
+            "public": self.body.get("public", False),
+            "files": {
+                filename: {"filename": filename, "content": content.get("content", "")}
+                for filename, content in self.body.get("files", {}).items()
+            },
+        }
+        self.standin.gists[gist_id] = gist
+        self._send(201, gist)
+
+    def _gist(self, gist_id):
+        gist = self.standin.gists.get(gist_id)
+        if gist is None:
+            return self._send(404, {"message": "Not Found"})
+        self._send(200, gist)
+
+    def _graphql(self):
+        """Answer the nodes(ids:) repository query of gh_graphql"""
+        ids = (self.body.get("variables") or {}).get("ids", [])
+        nodes = []
+        for node_id in ids:
+            repo = self.standin.corpus.by_node_id.get(node_id)
+            nodes.append(None if repo is None else self._graphql_node(repo))
+        self._send(200, {"data": {"nodes": nodes}})
+
+    @staticmethod
+    def _graphql_node(repo):
+        license_key = repo["license"]
+        return {
+            "databaseId": repo["id"],
+            "url": f"https://github.com/{repo['full_name']}",
+            "description": repo["description"],
+            "isFork": repo["fork"],
+            "diskUsage": repo["size"],
+            "stargazerCount": repo["stargazers_count"],
+            "forkCount": repo["forks_count"],
+            "pushedAt": repo["pushed_at"],
+            "updatedAt": repo["updated_at"],
+            "createdAt": repo["created_at"],
+            "primaryLanguage": {"name": repo["language"]},
+            "licenseInfo": license_key and {"name": LICENSES[license_key]},
+            "languages": {
+                "edges": [
+                    {"size": size, "node": {"name": language}}
+                    for language, size in repo["languages"].items()
+                ]
+            },
+            "repositoryTopics": {
+                "nodes": [{"topic": {"name": topic}} for topic in repo["topics"]]
+            },
+            "openIssues": {"totalCount": repo["open_issues"]},
+            "closedIssues": {"totalCount": repo["closed_issues"]},
+            "openPulls": {"totalCount": repo["open_pulls"]},
+            "closedPulls": {"totalCount": repo["closed_pulls"]},
+            "readme_md": {"text": repo["readme"]},
+        }
+
+
+@app.command()
+def serve(
+    port: int = typer.Option(8765, help="Port to listen on"),
+    repos: int = typer.Option(500, help="Number of synthetic repos"),
+    keyword: Optional[List[str]] = typer.Option(
+        None, help="Keyword the synthetic readmes mention, repeatable"
+    ),
+    corpus: Optional[str] = typer.Option(None, help="Serve a corpus saved with --dump"),
+    dump: Optional[str] = typer.Option(None, help="Save the corpus served to a file"),
+    latency_ms: float = typer.Option(0, help="Delay of every answer"),
+    jitter_ms: float = typer.Option(0, help="Random extra delay, up to this"),
+    secondary_rate: float = typer.Option(
+        0, help="Share of requests answered with a secondary rate limit"
+    ),
+    search_window: int = typer.Option(WINDOWS["search"], help="Search window (s)"),
+    core_window: int = typer.Option(WINDOWS["core"], help="Core window (s)"),
+    seed: int = typer.Option(0, help="Seed of the synthetic corpus"),
+):
+    """Serve a local stand-in of the GitHub API, point GITHUB_API_URL at it"""
+    if corpus is not None:
+        served = Corpus.load(corpus)
+    else:
+        served = Corpus.synthetic(repos, keyword or ["oneapi"], seed=seed)
+    if dump is not None:
+        served.dump(dump)
+    server = StandinServer(
+        served,
+        port=port,
+        latency=latency_ms / 1000,
+        jitter=jitter_ms / 1000,
+        secondary_rate=secondary_rate,
+        windows={"search": search_window, "core": core_window},
+        seed=seed,
+    )
+    print(f"serving {len(served.repos)} repos on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    app()
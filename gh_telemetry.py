@@ -0,0 +1,251 @@
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from rich.table import Table
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+_ENDPOINT_PATTERNS = [
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{owner}/{repo}"),
+    (re.compile(r"^/gists/[^/]+"), "/gists/{id}"),
+    (re.compile(r"^/users/[^/]+"), "/users/{user}"),
+]
+
+
+def endpoint_for(method, url):
+    """Name the endpoint of a request, with the path parameters left out"""
+    parts = urlsplit(url)
+    if parts.hostname == "raw.githubusercontent.com" or parts.path.startswith("/raw/"):
+        return f"{method} raw"
+    path = re.sub(r"^/api/v3", "", parts.path).rstrip("/") or "/"
+    for pattern, template in _ENDPOINT_PATTERNS:
+        path = pattern.sub(template, path)
+    return f"{method} {path}"
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Telemetry:
+    """Counts, latencies, retries, rate limit sleeps and quota of GitHub calls.
+
+    Requests are recorded by GithubAdapter, sleeps by the token pool and the
+    adapter, and tenacity retries by the RepoDetails getters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.latencies = defaultdict(list)
+            self.statuses = defaultdict(Counter)
+            self.retries = defaultdict(Counter)
+            self.sleeps = Counter()
+            self.quota_used = Counter()
+            self.quota_remaining = {}
+
+    def record_request(self, endpoint, resource, status, seconds, headers=None):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+            # conditional requests answered with 304 are free
+            if resource is not None and status != 304:
+                self.quota_used[resource] += 1
+            if headers and "X-RateLimit-Remaining" in headers:
+                resource = headers.get("X-RateLimit-Resource", resource)
+                remaining = int(headers["X-RateLimit-Remaining"])
+                self.quota_remaining[resource] = min(
+                    remaining, self.quota_remaining.get(resource, remaining)
+                )
+
+    def record_retry(self, endpoint, kind):
+        with self._lock:
+            self.retries[endpoint][kind] += 1
+
+    def record_sleep(self, reason, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.sleeps[reason] += seconds
+
+    def record_tenacity_retry(self, retry_state):
+        """before_sleep hook of tenacity, counts a retry and its backoff"""
+        self.record_retry(retry_state.fn.__name__, "backoff")
+        self.record_sleep("backoff", retry_state.next_action.sleep)
+
+    def report(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, latencies in sorted(self.latencies.items()):
+                ordered = sorted(latencies)
+                endpoints[endpoint] = {
+                    "count": len(ordered),
+                    "statuses": {
+                        str(status): count
+                        for status, count in self.statuses[endpoint].items()
+                    },
+                    "seconds": sum(ordered),
+                    "p50": _percentile(ordered, 0.5),
+                    "p90": _percentile(ordered, 0.9),
+                    "p99": _percentile(ordered, 0.99),
+                    "max": ordered[-1],
+                }
+            return {
+                "started_at": self.started_at,
+                "duration": time.time() - self.started_at,
+                "requests": sum(
+                    len(latencies) for latencies in self.latencies.values()
+                ),
+                "endpoints": endpoints,
+                "retries": {
+                    endpoint: dict(kinds) for endpoint, kinds in self.retries.items()
+                },
+                "sleeps": dict(self.sleeps),
+                "quota_used": dict(self.quota_used),
+                "quota_remaining": dict(self.quota_remaining),
+            }
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+    def write_prometheus(self, path):
+        """Write the metrics in the Prometheus text format, for node_exporter"""
+        lines = [
+            "# HELP github_request_duration_seconds Latency of GitHub requests.",
+            "# TYPE github_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for endpoint, latencies in sorted(self.latencies.items()):
+                ordered = sorted(latencies)
+                label = f'endpoint="{_label(endpoint)}"'
+                for bound in [*LATENCY_BUCKETS, "+Inf"]:
+                    count = (
+                        len(ordered)
+                        if bound == "+Inf"
+                        else bisect_right(ordered, bound)
+                    )
+                    lines.append(
+                        "github_request_duration_seconds_bucket"
+                        f'{{{label},le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f"github_request_duration_seconds_sum{{{label}}} {sum(ordered)}"
+                )
+                lines.append(
+                    f"github_request_duration_seconds_count{{{label}}} {len(ordered)}"
+                )
+            lines += [
+                "# HELP github_requests_total GitHub requests by status.",
+                "# TYPE github_requests_total counter",
+            ]
+            for endpoint, statuses in sorted(self.statuses.items()):
+                for status, count in sorted(statuses.items()):
+                    lines.append(
+                        f'github_requests_total{{endpoint="{_label(endpoint)}",'
+                        f'status="{status}"}} {count}'
+                    )
+            lines += [
+                "# HELP github_retries_total Retried GitHub calls.",
+                "# TYPE github_retries_total counter",
+            ]
+            for endpoint, kinds in sorted(self.retries.items()):
+                for kind, count in sorted(kinds.items()):
+                    lines.append(
+                        f'github_retries_total{{endpoint="{_label(endpoint)}",'
+                        f'kind="{kind}"}} {count}'
+                    )
+            lines += [
+                "# HELP github_sleep_seconds_total Time spent waiting on rate limits.",
+                "# TYPE github_sleep_seconds_total counter",
+            ]
+            for reason, seconds in sorted(self.sleeps.items()):
+                lines.append(
+                    f'github_sleep_seconds_total{{reason="{reason}"}} {seconds}'
+                )
+            lines += [
+                "# HELP github_quota_used_total Requests counted against a rate limit.",
+                "# TYPE github_quota_used_total counter",
+            ]
+            for resource, count in sorted(self.quota_used.items()):
+                lines.append(
+                    f'github_quota_used_total{{resource="{resource}"}} {count}'
+                )
+            lines += [
+                "# HELP github_quota_remaining Lowest budget left seen, over tokens.",
+                "# TYPE github_quota_remaining gauge",
+            ]
+            for resource, remaining in sorted(self.quota_remaining.items()):
+                lines.append(
+                    f'github_quota_remaining{{resource="{resource}"}} {remaining}'
+                )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+
+    def summary(self):
+        """Get a table of the endpoints by time spent, for the console"""
+        report = self.report()
+        table = Table(
+            title=(
+                f"GitHub calls: {report['requests']} requests in "
+                f"{report['duration']:.0f}s"
+            )
+        )
+        for column in ("endpoint", "count", "total s", "p50", "p90", "p99", "retries"):
+            table.add_column(
+                column, justify="left" if column == "endpoint" else "right"
+            )
+        ordered = sorted(
+            report["endpoints"].items(),
+            key=lambda item: item[1]["seconds"],
+            reverse=True,
+        )
+        for endpoint, stats in ordered:
+            table.add_row(
+                endpoint,
+                str(stats["count"]),
+                f"{stats['seconds']:.1f}",
+                f"{stats['p50'] * 1000:.0f}ms",
+                f"{stats['p90'] * 1000:.0f}ms",
+                f"{stats['p99'] * 1000:.0f}ms",
+                str(sum(report["retries"].get(endpoint, {}).values())),
+            )
+        for getter, kinds in report["retries"].items():
+            if getter not in report["endpoints"]:
+                table.add_row(getter, "", "", "", "", "", str(sum(kinds.values())))
+        table.caption = "; ".join(
+            [
+                "waiting: "
+                + ", ".join(
+                    f"{reason} {seconds:.1f}s"
+                    for reason, seconds in report["sleeps"].items()
+                ),
+                "quota used: "
+                + ", ".join(
+                    f"{resource} {count}"
+                    for resource, count in report["quota_used"].items()
+                ),
+            ]
+        )
+        return table
+
+
+telemetry = Telemetry()
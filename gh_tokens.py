@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+
+from config import RATE_LIMIT_PACE
+from gh_ratelimit import AdaptiveRateLimiter
+from gh_telemetry import telemetry
+
+
+def load_tokens():
+    """Get the GitHub tokens from GTOKENS (comma separated), or from GTOKEN"""
+    tokens = os.environ.get("GTOKENS") or os.environ.get("GTOKEN") or ""
+    return [token.strip() for token in tokens.split(",") if token.strip()]
+
+
+class TokenPool:
+    """Spread GitHub requests over several tokens, each with its own budgets.
+
+    Every request goes to the token with the most headroom left on the
+    resource it is counted against, so throughput grows with the number of
+    tokens.
+    """
+
+    def __init__(self, tokens, pace=True):
+        self.tokens = list(dict.fromkeys(tokens))
+        self.pace = pace
+        self.limiters = {token: AdaptiveRateLimiter(pace=pace) for token in self.tokens}
+        self._lock = threading.Lock()
+        self._slept = 0.0
+
+    @property
+    def slept(self):
+        """Seconds spent waiting for rate limits, over all tokens"""
+        return self._slept + sum(limiter.slept for limiter in self.limiters.values())
+
+    def _rank(self, token, resource, now):
+        # earliest free slot first, the larger budget left breaks ties
+        available_at, remaining = self.limiters[token].available_at(resource)
+        return max(available_at, now), -remaining
+
+    def reset(self, pace=None):
+        """Forget the budgets learned so far, as when pointed at another server.
+
+        pace, when given, turns pacing on or off from now on.
+        """
+        with self._lock:
+            if pace is not None:
+                self.pace = pace
+            self.limiters = {
+                token: AdaptiveRateLimiter(pace=self.pace) for token in self.tokens
+            }
+            self._slept = 0.0
+
+    def acquire(self, resource):
+        """Pick the token with the most headroom and wait for its next slot"""
+        if not self.tokens:
+            return None
+        with self._lock:
+            now = time.time()
+            token = min(
+                self.tokens, key=lambda token: self._rank(token, resource, now)
+            )
+            delay = self.limiters[token].reserve(resource)
+        if delay > 0:
+            self.limiters[token].sleep(delay)
+        return token
+
+    def update(self, token, resource, headers):
+        return self.limiters[token].update(resource, headers)
+
+    def retry_delay(self, token, response, attempt):
+        return self.limiters[token].retry_delay(response, attempt)
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._slept += seconds
+        time.sleep(seconds)
+
+    def wait_for_reset(self, resource, headers=None):
+        """Sleep until one of the tokens has budget left on resource"""
+        if not self.tokens:
+            return
+        if headers:
+            headers = {name.lower(): value for name, value in headers.items()}
+            resource = headers.get("x-ratelimit-resource", resource)
+        delay = min(
+            limiter.available_at(resource)[0] for limiter in self.limiters.values()
+        ) - time.time()
+        if delay > 0:
+            telemetry.record_sleep("reset", delay)
+            self.sleep(delay)
+
+
+token_pool = TokenPool(load_tokens(), pace=RATE_LIMIT_PACE)
@@ -1,6 +1,5 @@
-import os
 
-from github import Github
+from gh_http import get_github
 from rich import box
 from rich.console import Console
 from rich.table import Table
@@ -28,7 +27,7 @@ def get_repo_details(url):
         repo (Repository): Repository object
 
     """
-    gh = Github(os.environ["GTOKEN"])
+    gh = get_github()
     print(f"repo: {url.split('/')[-2] + '/' + url.split('/')[-1]}")
     repo = gh.get_repo(url.split("/")[-2] + "/" + url.split("/")[-1])
     repo_details = RepoDetails()
@@ -88,12 +87,12 @@ def print_rich_repo_details(repo_details):
 
 import random
 
-from github import Github, InputFileContent
+from github import InputFileContent
 
 
 def create_gist_from_file(markdown_file_path):
-    # Authenticate with GitHub using the provided access token
-    github = Github(os.environ["GTOKEN"])
+    # Authenticate with GitHub using the tokens of the shared pool
+    github = get_github()
 
     # Read the contents of the Markdown file
     with open(markdown_file_path, "r") as f:
@@ -51,7 +51,7 @@ def wait_with_backoff(retries, max_retries, base_wait_time, backoff_factor):
     else:
         print("Max retries exceeded. Exiting.")
         return False
-from pyrate_limiter import RequestRate, Limiter, Duration
+from gh_tokens import token_pool
 
 
 def process_readme_keywords(
@@ -107,13 +107,9 @@ def process_readme_keywords(
                         save_progress(keyword, page)
             page += 1
         except RateLimitExceededException as e:
-            print("rate limit exeeded, time to reset: ", e.reset")
             save_progress(keyword, page)
-            #reset_time = datetime.fromtimestamp(e.reset)  # type: ignore
-            #wait_time = (reset_time - datetime.now()).seconds
-            #if not wait_with_backoff(retries, max_retries, wait_time, backoff_factor):
-            #    break
-            #retries += 1
+            print("rate limit exceeded, waiting for the reset...")
+            token_pool.wait_for_reset("search", e.headers)
         except GithubException as e:
             print(
                 f"An error occurred while processing the keyword '{keyword}' on page {page}: {e}"
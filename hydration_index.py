@@ -0,0 +1,86 @@
+import sqlite3
+import threading
+import time
+
+from config import HYDRATION_FRESHNESS_HOURS
+from db import connect
+
+
+class HydrationIndex:
+    """Run-wide record of the repos already hydrated, keyed by repo id.
+
+    A repo found by several keywords or partitions is hydrated by the first
+    one to claim it, the others only add their keyword to it. Hydrations saved
+    to the database count across runs for freshness_hours.
+    """
+
+    def __init__(self, freshness_hours=0):
+        self.freshness = freshness_hours * 3600
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._hydrated = None
+
+    @staticmethod
+    def _connect():
+        conn = connect()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS hydration_index
+                (id INTEGER PRIMARY KEY,
+                hydrated_at REAL NOT NULL)"""
+        )
+        return conn
+
+    def _load(self):
+        # only rows still stored count, repo_details is wiped by full refreshes
+        conn = self._connect()
+        rows = conn.execute(
+            """SELECT h.id FROM hydration_index h
+                JOIN repo_details d ON d.id = h.id
+                WHERE h.hydrated_at >= ?""",
+            (time.time() - self.freshness,),
+        ).fetchall()
+        conn.close()
+        return {repo_id for (repo_id,) in rows}
+
+    def claim(self, repo_id, owner):
+        """Claim a repo for owner to hydrate, False if it is hydrated or claimed"""
+        with self._lock:
+            if self._hydrated is None:
+                try:
+                    self._hydrated = self._load() if self.freshness > 0 else set()
+                except sqlite3.OperationalError:
+                    # no repo_details table yet, nothing was ever hydrated
+                    self._hydrated = set()
+            if repo_id in self._hydrated or repo_id in self._claims:
+                return False
+            self._claims[repo_id] = owner
+            return True
+
+    def confirm(self, repo_ids, owner):
+        """Record the repos of owner as hydrated, once their details are saved"""
+        with self._lock:
+            confirmed = [
+                repo_id for repo_id in repo_ids if self._claims.get(repo_id) is owner
+            ]
+            for repo_id in confirmed:
+                del self._claims[repo_id]
+                self._hydrated.add(repo_id)
+        if confirmed:
+            now = time.time()
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO hydration_index (id, hydrated_at) VALUES (?, ?)",
+                [(repo_id, now) for repo_id in confirmed],
+            )
+            conn.commit()
+            conn.close()
+
+    def release(self, repo_ids, owner):
+        """Give up the claims of owner that were not saved, so they are hydrated again"""
+        with self._lock:
+            for repo_id in repo_ids:
+                if self._claims.get(repo_id) is owner:
+                    del self._claims[repo_id]
+
+
+hydration_index = HydrationIndex(HYDRATION_FRESHNESS_HOURS)
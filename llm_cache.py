@@ -0,0 +1,69 @@
+import hashlib
+import time
+
+from lru_store import LRUStore
+
+# use:     answer from the cache, store what is missing
+# refresh: ask again and overwrite the stored answers
+# bypass:  leave the cache alone
+MODES = ("use", "refresh", "bypass")
+
+
+class LLMCache(LRUStore):
+    """On-disk cache of chat completions keyed by model, prompts and readme.
+
+    Entries expire after ttl seconds, and are evicted least recently used first
+    once the stored answers grow past max_bytes.
+    """
+
+    def __init__(self, path, max_bytes, ttl, mode="use"):
+        if mode not in MODES:
+            raise ValueError(f"unknown llm cache mode {mode!r}, use one of {MODES}")
+        super().__init__(
+            path,
+            "completions",
+            max_bytes,
+            columns=("request_bytes INTEGER", "created_at REAL"),
+        )
+        self.ttl = ttl
+        self.mode = mode
+        self.bytes_saved = 0
+        self._delete_where("created_at < ?", (time.time() - ttl,))
+
+    @staticmethod
+    def key(model, system_message, user_template, readme_text):
+        """Hash what a completion depends on, the readme as it is sent"""
+        digest = hashlib.sha256()
+        for part in (model, system_message, user_template, readme_text):
+            digest.update(part.encode("utf-8"))
+            # a separator, so moving text between parts changes the key
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Get the stored answer of a key, None when missing, stale or not read"""
+        if self.mode != "use":
+            return None
+        row = self._get(key, "request_bytes", "created_at")
+        if row is None or row[1] < time.time() - self.ttl:
+            self.record_miss()
+            return None
+        request_bytes, _, answer = row
+        self.touch(key)
+        with self._lock:
+            self.bytes_saved += request_bytes
+        return answer.decode("utf-8")
+
+    def put(self, key, answer, request_bytes):
+        """Store the answer to a request of request_bytes"""
+        if self.mode == "bypass":
+            return
+        self._put(
+            key,
+            answer.encode("utf-8"),
+            request_bytes=request_bytes,
+            created_at=time.time(),
+        )
+
+    def stats(self):
+        return {"mode": self.mode, **super().stats(), "bytes_saved": self.bytes_saved}
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class LRUStore:
+    """On-disk store of compressed bodies, evicted least recently used first.
+
+    Entries are kept in one SQLite table, next to the columns given by the
+    subclass, and are dropped once the stored bodies grow past max_bytes.
+    """
+
+    def __init__(self, path, table, max_bytes, columns=()):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.table = table
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table}
+                (key TEXT PRIMARY KEY,
+                {"".join(f"{column}, " for column in columns)}body BLOB,
+                size INTEGER,
+                accessed_at REAL)"""
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)"
+        )
+        self._conn.commit()
+        self.total_bytes = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self._conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()[0]
+
+    def _get(self, key, *columns):
+        """Get the given columns of key followed by its body, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join([*columns, 'body'])} FROM {self.table} "
+                "WHERE key=?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return (*row[:-1], zlib.decompress(row[-1]))
+
+    def _put(self, key, body, **columns):
+        """Store a body under key, along with the given columns"""
+        compressed = zlib.compress(body)
+        names = ["key", *columns, "body", "size", "accessed_at"]
+        with self._lock:
+            previous = self._conn.execute(
+                f"SELECT size FROM {self.table} WHERE key=?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' * len(names))})",
+                (key, *columns.values(), compressed, len(compressed), time.time()),
+            )
+            self.total_bytes += len(compressed) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _delete_where(self, condition, params=()):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE {condition}", params)
+            self._conn.commit()
+            self.total_bytes = self._stored_bytes()
+
+    def touch(self, key):
+        """Record a hit on key, which makes it the most recently used"""
+        with self._lock:
+            self.hits += 1
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at=? WHERE key=?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _evict(self):
+        """Drop least recently used entries until the store fits in max_bytes"""
+        while self.total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key=?", (key,))
+                self.total_bytes -= size
+                self.evictions += 1
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "stored_bytes": self.total_bytes,
+        }
@@ -2,9 +2,8 @@ import json
 import sys
 import time
 
-from github import Github
-
 from suppress_warnings import *
+from gh_http import get_github
 from config import README_KEYWORDS
 from config import PROGRESS_FILE
 from repo import RepoAnalyzer
@@ -62,7 +61,7 @@ def process_and_save(gh_fetcher, last_keyword, last_page, filename):
 
 def main():
     _check_env()
-    gh = Github(os.environ["GTOKEN"])
+    gh = get_github()
     analyzer = RepoAnalyzer(gh)
     dir_path = create_dir("./results")
     fname = f"filtered_readme_repos_{time.strftime('%Y%m%d-%H%M%S')}.csv"
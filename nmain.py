@@ -2,9 +2,9 @@ import json
 import sys
 import time
 
-from github import Github
-
 from suppress_warnings import *
+from gh_http import get_github
+from gh_tokens import load_tokens
 from config import README_KEYWORDS
 from config import PROGRESS_FILE
 from repo import RepoAnalyzer
@@ -25,11 +25,9 @@ def _check_env():
         print(
             "\nExport 'OPENAI_API_KEY=<openai_api_key>' to your environment, to use openai emebddings."
         )
-    try:
-        os.environ["GTOKEN"]
-    except KeyError:
+    if not load_tokens():
         print(
-            "\nExport 'GTOKEN=<github_token>' to your environment, it is a prerequisite to continue, exiting..."
+            "\nExport 'GTOKEN=<github_token>' (or 'GTOKENS=<token1>,<token2>,...') to your environment, it is a prerequisite to continue, exiting..."
         )
         sys.exit(0)
 
@@ -68,7 +66,7 @@ def fetch_and_save(gh_fetcher, last_keyword, last_page, filename):
 
 def main():
     _check_env()
-    gh = Github(os.environ["GTOKEN"])
+    gh = get_github()
     analyzer = RepoAnalyzer(gh)
     dir_path = create_dir("./results")
     fname = f"filtered_readme_repos_{time.strftime('%Y%m%d-%H%M%S')}.csv"
@@ -62,7 +62,6 @@ class RepoDetails():
         self.size = repo.size  
         self.watchers_count = repo.watchers_count
         self.language = repo.language
-        self.readme = self.get_repo_readme_content()
 
 
     def get_repo_license(self):
@@ -1,11 +1,123 @@
+import hashlib
+import json
 import re
+import threading
+import time
 
 import openai
-from pyrate_limiter import Limiter, RequestRate
+from pyrate_limiter import BucketFullException, Limiter, RequestRate
 from tenacity import (retry, retry_if_exception_type, stop_after_attempt,
-                      wait_fixed)
+                      wait_exponential)
 
+from config import (LLM_CACHE, LLM_CACHE_MAX_MB, LLM_CACHE_MODE,
+                    LLM_CACHE_PATH, LLM_CACHE_TTL_DAYS)
+from llm_cache import LLMCache
+
+# one budget for every call, whichever thread or field it is made for
 limiter = Limiter(RequestRate(60, 60), RequestRate(60000, 600))
+# set by a 429, every caller holds off until then
+_paused_until = 0.0
+_pause_lock = threading.Lock()
+# opened on first use, so importing openai_utils creates no file
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+MODEL = "gpt-3.5-turbo"
+
+CATEGORY_SYSTEM = "You are a helpful and an expert assistant who classifies GitHub repos into categories based on their README content."
+CATEGORIES = [
+    "AI - Machine Learning",
+    "AI - Natural Language Processing",
+    "Rendering",
+    "AI - Computer Vision",
+    "AI - Data Science",
+    "AI - Reinforcement Learning",
+    "Medical and Life Sciences",
+    "Mathematics and Science",
+    "Tools & Development",
+    "Financial Services",
+    "Manufacturing",
+    "Tutorials",
+    "HPC",
+    "AI-Frameworks",
+]
+CATEGORY_USER = (
+    "Please provide the most relevant category for the following GitHub project "
+    "README without explanation. Choose from: "
+    + ", ".join(f"'{category}'" for category in CATEGORIES)
+    + ". The input README is:\n\n{readme_text}"
+)
+SUMMARY_SYSTEM = "You are a helpful assistant that generates a brief 2 to 3 line summary of GitHub project READMEs."
+SUMMARY_USER = "Please provide a brief 2 to 3 line summary of the following GitHub project README without explaining it:\n\n{readme_text}"
+RELEVANCY_SYSTEM = "You are a helpful assistant who is an expert in finding relevant documents."
+RELEVANCY_USER = """Please provide a score between 0 to 1 (0 lowest, 1 highest) on how much the following GitHub project README, mentions the use or uses of any Intel oneAPI components or any of the components from the list: '- oneDAL, intel_extension_for_pytorch', '- intel_extension_for_transformers', '- intel_extension_for_horovod', '- intel_neural_compressor', '- intel_extension_for_tensorflow', '- oneAPI Base Toolkit', '- oneAPI AI Toolkit', '- oneAPI HPC Toolkit', '- oneAPI Rendering Toolkit', '- openvino', '- daal4py', '- scikit-learn-intelex', '- oneTBB', '- oneMKL', '- oneVPL', '- oneDPL', '- oneCCL', '- onednn', '- open VKL', '- Embree', '- OSPRay', '- Open Image Denoise'. If the project or its development has been discontinued, then the score should be set to zero. Format your response as 'Relevancy_score = x, Reasons = [reason1, reason2]'. Consider any mention of oneAPI, its components, or the listed libraries as relevant. The input README is:\n\n{readme_text}\n\nExample 1:\nInput: The README mentions OneDAL library which is designed to accelerate big data analysis using Intel hardware. However, there is no mention of any specific oneAPI components or libraries being used or integrated with OneDAL.\nOutput: Relevancy_score = 0.7, Reasons = [Mentions OneDAL, which is a specific oneAPI components or libraries]\n\nExample 2:\nInput: The README provides information about using the oneapi.jl package to work with the oneAPI unified programming model, which is part of the Intel Compute Runtime available on Linux.\nOutput: Relevancy_score = 0.8, Reasons = [Mentions oneapi.jl package and oneAPI unified programming model, Part of Intel Compute Runtime on Linux]"""
+COMBINED_SYSTEM = (
+    "You are a helpful assistant who is an expert in Intel oneAPI and in reading "
+    "GitHub project READMEs. You answer by calling the given function."
+)
+COMBINED_USER = (
+    "For the following GitHub project README, give: a relevancy score between "
+    "0 and 1 (0 lowest, 1 highest) of how much it mentions the use of any Intel "
+    "oneAPI component or of any of these libraries: oneDAL, "
+    "intel_extension_for_pytorch, intel_extension_for_transformers, "
+    "intel_extension_for_horovod, intel_neural_compressor, "
+    "intel_extension_for_tensorflow, oneAPI Base Toolkit, oneAPI AI Toolkit, "
+    "oneAPI HPC Toolkit, oneAPI Rendering Toolkit, openvino, daal4py, "
+    "scikit-learn-intelex, oneTBB, oneMKL, oneVPL, oneDPL, oneCCL, onednn, open VKL, "
+    "Embree, OSPRay, Open Image Denoise, with the reasons for the score; a "
+    "brief 2 to 3 line summary of the project; and its most relevant category. "
+    "If the project or its development has been discontinued, the score is "
+    "zero. The input README is:"
+    "\n\n{readme_text}"
+)
+ENRICH_FUNCTION = {
+    "name": "record_readme_enrichment",
+    "description": "Record the relevancy, summary and category of a README.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "relevancy_score": {"type": "number", "minimum": 0, "maximum": 1},
+            "reasons": {"type": "array", "items": {"type": "string"}},
+            "summary": {
+                "type": "string",
+                "description": "A brief 2 to 3 line summary of the project.",
+            },
+            "category": {"type": "string", "enum": CATEGORIES},
+        },
+        "required": ["relevancy_score", "reasons", "summary", "category"],
+        "additionalProperties": False,
+    },
+}
+# fields of a combined answer, each cached on its own
+ENRICH_FIELDS = ("score", "reasons", "summary", "category")
+# the score of an answer that could not be parsed
+UNPARSED_SCORE = 0.1234
+
+
+def version_of(*parts):
+    """Get a short hash of what produces a field, to tell outdated values"""
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:12]
+
+
+# stored along with each field, a new model or prompt makes older values stale
+SUMMARY_VERSION = version_of(MODEL, SUMMARY_SYSTEM, SUMMARY_USER)
+RELEVANCY_VERSION = version_of(MODEL, RELEVANCY_SYSTEM, RELEVANCY_USER)
+COMBINED_VERSION = version_of(MODEL, COMBINED_SYSTEM, COMBINED_USER, ENRICH_FUNCTION)
+
+
+def get_llm_cache():
+    """Get the shared completion cache, None when it is turned off"""
+    global _llm_cache
+    if not LLM_CACHE:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache(
+                LLM_CACHE_PATH,
+                LLM_CACHE_MAX_MB * 1024 * 1024,
+                LLM_CACHE_TTL_DAYS * 86400,
+                mode=LLM_CACHE_MODE,
+            )
+    return _llm_cache
 
 
 def _truncate_tokens(text, max_chars=10000):
@@ -20,50 +132,142 @@ def process_string(s: str) -> str:
     return s
 
 
+def _acquire_slot():
+    """Wait for a request slot, blocking the thread instead of failing"""
+    while True:
+        delay = _paused_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+            continue
+        try:
+            limiter.try_acquire("openai")
+            return
+        except BucketFullException as err:
+            time.sleep(err.meta_info["remaining_time"])
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After") or headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+_exponential = wait_exponential(multiplier=1, min=1, max=30)
+
+
+def _backoff(retry_state):
+    """Wait as long as a 429 asks for, and have the other callers wait too"""
+    global _paused_until
+    error = retry_state.outcome.exception()
+    delay = _retry_after(error)
+    if delay is None:
+        delay = _exponential(retry_state)
+    if isinstance(error, openai.error.RateLimitError):
+        with _pause_lock:
+            _paused_until = max(_paused_until, time.time() + delay)
+    return delay
+
+
 @retry(
     stop=stop_after_attempt(5),
-    wait=wait_fixed(1),
+    wait=_backoff,
     retry_error_callback=lambda _: None,
-    retry=retry_if_exception_type(openai.APIError),
+    retry=retry_if_exception_type(
+        (
+            openai.APIError,
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.Timeout,
+        )
+    ),
 )
-def call_openai_api(system_message: str, user_message: str, readme_text: str) -> str:
-    readme_text = _truncate_tokens(readme_text)
+def _complete(
+    system_message: str, user_message: str, readme_text: str, function=None
+) -> str:
+    """Get the answer, or the arguments of the call to function when given"""
+    _acquire_slot()
+    kwargs = (
+        {"functions": [function], "function_call": {"name": function["name"]}}
+        if function
+        else {}
+    )
     response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+        model=MODEL,
         messages=[
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_message.format(readme_text=readme_text)},
         ],
+        **kwargs,
     )
-    assistant_message = response.choices[0].message.content.strip()
+    message = response.choices[0].message
+    if function and message.get("function_call"):
+        return message["function_call"].get("arguments") or ""
+    assistant_message = (message.get("content") or "").strip()
+    return assistant_message
+
+
+def call_openai_api(
+    system_message: str, user_message: str, readme_text: str, cache_if=None
+) -> str:
+    """Get the answer to a prompt about a readme, from the cache when stored.
+
+    cache_if, when given, tells the answers worth caching; the others are
+    asked again next time.
+    """
+    readme_text = _truncate_tokens(readme_text)
+    llm_cache = get_llm_cache()
+    if llm_cache is None:
+        return _complete(system_message, user_message, readme_text)
+    key = llm_cache.key(MODEL, system_message, user_message, readme_text)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    assistant_message = _complete(system_message, user_message, readme_text)
+    # None when every retry failed, asked again next time
+    if assistant_message is not None and (
+        cache_if is None or cache_if(assistant_message)
+    ):
+        request_bytes = len(system_message.encode("utf-8")) + len(
+            user_message.format(readme_text=readme_text).encode("utf-8")
+        )
+        llm_cache.put(key, assistant_message, request_bytes)
     return assistant_message
 
 
+# every field call answers None once its retries are spent, the field is then
+# left empty and computed again on the next run
 def classify_readme_category(readme_text: str) -> str:
-    limiter.try_acquire("classify_text")
-    system_message = "You are a helpful and an expert assistant who classifies GitHub repos into categories based on their README content."
-    user_message = "Please provide the most relevant category for the following GitHub project README without explanation. Choose from: 'AI - Machine Learning', 'AI - Natural Language Processing', 'Rendering', 'AI - Computer Vision', 'AI - Data Science', 'AI - Reinforcement Learning', 'Medical and Life Sciences', 'Mathematics and Science', 'Tools & Development', 'Financial Services', 'Manufacturing', 'Tutorials', 'HPC', 'AI-Frameworks'. The input README is:\n\n{readme_text}"
-    assistant_message = call_openai_api(system_message, user_message, readme_text)
+    assistant_message = call_openai_api(CATEGORY_SYSTEM, CATEGORY_USER, readme_text)
+    if assistant_message is None:
+        return None
     return process_string(assistant_message)
 
 
 def summarize_readme(readme_text: str) -> str:
-    limiter.try_acquire("summarize_text")
-    system_message = "You are a helpful assistant that generates a brief 2 to 3 line summary of GitHub project READMEs."
-    user_message = "Please provide a brief 2 to 3 line summary of the following GitHub project README without explaining it:\n\n{readme_text}"
-    return call_openai_api(system_message, user_message, readme_text)
+    return call_openai_api(SUMMARY_SYSTEM, SUMMARY_USER, readme_text)
 
 
-def get_relevancy_score_and_reasons(readme_text, debug=False):
-    limiter.try_acquire("relevant_repo")
-    system_message = (
-        "You are a helpful assistant who is an expert in finding relevant documents."
-    )
-    user_message = """Please provide a score between 0 to 1 (0 lowest, 1 highest) on how much the following GitHub project README, mentions the use or uses of any Intel oneAPI components or any of the components from the list: '- oneDAL, intel_extension_for_pytorch', '- intel_extension_for_transformers', '- intel_extension_for_horovod', '- intel_neural_compressor', '- intel_extension_for_tensorflow', '- oneAPI Base Toolkit', '- oneAPI AI Toolkit', '- oneAPI HPC Toolkit', '- oneAPI Rendering Toolkit', '- openvino', '- daal4py', '- scikit-learn-intelex', '- oneTBB', '- oneMKL', '- oneVPL', '- oneDPL', '- oneCCL', '- onednn', '- open VKL', '- Embree', '- OSPRay', '- Open Image Denoise'. If the project or its development has been discontinued, then the score should be set to zero. Format your response as 'Relevancy_score = x, Reasons = [reason1, reason2]'. Consider any mention of oneAPI, its components, or the listed libraries as relevant. The input README is:\n\n{readme_text}\n\nExample 1:\nInput: The README mentions OneDAL library which is designed to accelerate big data analysis using Intel hardware. However, there is no mention of any specific oneAPI components or libraries being used or integrated with OneDAL.\nOutput: Relevancy_score = 0.7, Reasons = [Mentions OneDAL, which is a specific oneAPI components or libraries]\n\nExample 2:\nInput: The README provides information about using the oneapi.jl package to work with the oneAPI unified programming model, which is part of the Intel Compute Runtime available on Linux.\nOutput: Relevancy_score = 0.8, Reasons = [Mentions oneapi.jl package and oneAPI unified programming model, Part of Intel Compute Runtime on Linux]"""
-    assistant_message = call_openai_api(system_message, user_message, readme_text)
+def _match_relevancy(assistant_message):
     first_line = assistant_message.strip().split("\n")[0]
     score_match = re.search(r"Relevancy_score\s*=\s*([\d.]+)", first_line)
     reasons_match = re.search(r"Reasons\s*=\s*\[(.+)\]", first_line)
+    return score_match, reasons_match
+
+
+def get_relevancy_score_and_reasons(readme_text, debug=False):
+    assistant_message = call_openai_api(
+        RELEVANCY_SYSTEM,
+        RELEVANCY_USER,
+        readme_text,
+        # an answer out of format is not kept, or it would be served until
+        # the cache expires
+        cache_if=lambda answer: all(_match_relevancy(answer)),
+    )
+    if assistant_message is None:
+        return {"score": None, "reasons": []}
+    score_match, reasons_match = _match_relevancy(assistant_message)
     if score_match and reasons_match:
         relevancy_score = float(score_match.group(1))
         reasons_str = reasons_match.group(1)
@@ -77,6 +281,122 @@ def get_relevancy_score_and_reasons(readme_text, debug=False):
             )
             print("score_match: ", score_match)
             print("reasons_match: ", reasons_match)
-        relevancy_score = 0.1234
+        relevancy_score = UNPARSED_SCORE
         reasons = []
     return {"score": relevancy_score, "reasons": reasons}
+
+
+def _parse_json_object(text):
+    """Get the JSON object of an answer, also when wrapped in prose or fences"""
+    if not text:
+        return {}
+    try:
+        data = json.loads(text)
+    except ValueError:
+        match = re.search(r"\{.*\}", text, re.S)
+        if match is None:
+            return {}
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+_CATEGORY_NAMES = {category.lower(): category for category in CATEGORIES}
+
+
+def _valid_fields(data):
+    """Keep the fields of a combined answer that have the expected shape"""
+    fields = {}
+    try:
+        score = float(data.get("relevancy_score"))
+        if 0 <= score <= 1:
+            fields["score"] = score
+    except (TypeError, ValueError):
+        pass
+    reasons = data.get("reasons")
+    if isinstance(reasons, str):
+        reasons = reasons.split(",")
+    if isinstance(reasons, list):
+        fields["reasons"] = [str(reason).strip() for reason in reasons if str(reason).strip()]
+    summary = data.get("summary")
+    if isinstance(summary, str) and summary.strip():
+        fields["summary"] = summary.strip()
+    category = _CATEGORY_NAMES.get(str(data.get("category") or "").strip().lower())
+    if category is not None:
+        fields["category"] = category
+    return fields
+
+
+def _field_key(field, readme_text):
+    template = f"{COMBINED_USER}\0{json.dumps(ENRICH_FUNCTION, sort_keys=True)}\0{field}"
+    return LLMCache.key(MODEL, COMBINED_SYSTEM, template, readme_text)
+
+
+def _cached_fields(readme_text):
+    fields = {}
+    llm_cache = get_llm_cache()
+    if llm_cache is None:
+        return fields
+    for field in ENRICH_FIELDS:
+        cached = llm_cache.get(_field_key(field, readme_text))
+        if cached is not None:
+            fields[field] = json.loads(cached)
+    return fields
+
+
+def _cache_fields(readme_text, fields):
+    llm_cache = get_llm_cache()
+    if llm_cache is None or not fields:
+        return
+    request_bytes = len(COMBINED_SYSTEM.encode("utf-8")) + len(
+        COMBINED_USER.format(readme_text=readme_text).encode("utf-8")
+    )
+    for field, value in fields.items():
+        # a hit on every field adds up to the whole request
+        llm_cache.put(
+            _field_key(field, readme_text),
+            json.dumps(value),
+            request_bytes // len(ENRICH_FIELDS),
+        )
+
+
+def enrich_readme(readme_text: str) -> dict:
+    """Get the relevancy score, reasons, summary and category of a README at once.
+
+    One request with a function schema replaces the three separate calls. Every
+    field is cached on its own, and a field missing from the answer or of the
+    wrong shape falls back to its separate call.
+    """
+    readme_text = _truncate_tokens(readme_text)
+    fields = _cached_fields(readme_text)
+    if len(fields) == len(ENRICH_FIELDS):
+        return fields
+    answer = _complete(
+        COMBINED_SYSTEM, COMBINED_USER, readme_text, function=ENRICH_FUNCTION
+    )
+    found = {**_valid_fields(_parse_json_object(answer)), **fields}
+    # fields that failed are not cached, the next run asks for them again
+    failed = set()
+    if "score" not in found:
+        relevancy = get_relevancy_score_and_reasons(readme_text)
+        found["score"], found["reasons"] = relevancy["score"], relevancy["reasons"]
+        if relevancy["score"] in (None, UNPARSED_SCORE):
+            failed.update(("score", "reasons"))
+    found.setdefault("reasons", [])
+    if "summary" not in found:
+        found["summary"] = summarize_readme(readme_text)
+    if "category" not in found:
+        found["category"] = classify_readme_category(readme_text)
+    # fallbacks too, so the next run needs no request at all; failed calls
+    # answer None and are asked again
+    _cache_fields(
+        readme_text,
+        {
+            f: v
+            for f, v in found.items()
+            if f not in fields and f not in failed and v is not None
+        },
+    )
+    return found
@@ -0,0 +1,121 @@
+import hashlib
+import sqlite3
+import zlib
+
+# readmes are mostly markdown and compress to about a third
+COMPRESSION_LEVEL = 6
+# under the default limit of 999 variables of older SQLite builds
+_CHUNK_SIZE = 500
+
+
+def readme_hash(text):
+    """Get the content address of a readme, None for a missing or empty one"""
+    if not text:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def create_readme_table(cursor):
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS readme_blobs
+            (hash TEXT PRIMARY KEY,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL)"""
+    )
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), _CHUNK_SIZE):
+        yield items[start : start + _CHUNK_SIZE]
+
+
+def _stored_hashes(cursor, hashes):
+    stored = set()
+    for chunk in _chunks(hashes):
+        cursor.execute(
+            f"SELECT hash FROM readme_blobs WHERE hash IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        stored.update(readme_hash for (readme_hash,) in cursor.fetchall())
+    return stored
+
+
+def put_readmes(cursor, readmes):
+    """Store readmes given by hash, each distinct readme only once.
+
+    Readmes already stored are not compressed again, which keeps refreshes of
+    unchanged repos cheap.
+    """
+    stored = _stored_hashes(cursor, readmes)
+    rows = []
+    for readme_hash, text in readmes.items():
+        if readme_hash in stored:
+            continue
+        body = text.encode("utf-8")
+        rows.append((readme_hash, zlib.compress(body, COMPRESSION_LEVEL), len(body)))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO readme_blobs (hash, body, size) VALUES (?, ?, ?)", rows
+    )
+
+
+def get_readmes(conn, hashes):
+    """Get the readmes of hashes as a dict, missing ones are left out"""
+    cursor = conn.cursor()
+    readmes = {}
+    for chunk in _chunks({readme_hash for readme_hash in hashes if readme_hash}):
+        cursor.execute(
+            "SELECT hash, body FROM readme_blobs "
+            f"WHERE hash IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for readme_hash, body in cursor.fetchall():
+            readmes[readme_hash] = zlib.decompress(body).decode("utf-8")
+    return readmes
+
+
+def get_readme(conn, readme_hash):
+    """Get the readme of a hash, empty when there is none"""
+    return get_readmes(conn, [readme_hash]).get(readme_hash, "")
+
+
+def prune_readmes(cursor):
+    """Delete the readmes no repo refers to anymore"""
+    cursor.execute(
+        """DELETE FROM readme_blobs WHERE hash NOT IN
+            (SELECT readme_hash FROM repo_details WHERE readme_hash IS NOT NULL)"""
+    )
+
+
+def migrate_readme_column(cursor, table):
+    """Move the readme texts of a table created before the blob store.
+
+    Returns True when readmes were moved out, the database is then worth a
+    VACUUM to give the space back.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    if "readme" not in {row[1] for row in cursor.fetchall()}:
+        return False
+    cursor.execute(
+        f"SELECT rowid FROM {table} WHERE readme IS NOT NULL AND readme != ''"
+    )
+    rowids = [rowid for (rowid,) in cursor.fetchall()]
+    for chunk in _chunks(rowids):
+        cursor.execute(
+            f"SELECT rowid, readme FROM {table} "
+            f"WHERE rowid IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        readmes, hashes = {}, []
+        for rowid, text in cursor.fetchall():
+            hashes.append((readme_hash(text), rowid))
+            readmes[hashes[-1][0]] = text
+        put_readmes(cursor, readmes)
+        cursor.executemany(f"UPDATE {table} SET readme_hash=? WHERE rowid=?", hashes)
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute(f"ALTER TABLE {table} DROP COLUMN readme")
+        return True
+    # older SQLite cannot drop a column, the emptied one is left in place
+    if rowids:
+        cursor.execute(f"UPDATE {table} SET readme = NULL")
+    return bool(rowids)
@@ -11,10 +11,6 @@ from github import UnknownObjectException
 from config import PROGRESS_FILE
 from detect_license import LicenseParser
 from utils import preprocess_text
-from pyrate_limiter import RequestRate, Limiter, Duration
-
-hourly_rate = RequestRate(5000, Duration.HOUR)
-limiter = Limiter(hourly_rate)
 
 
 class RepoAnalyzer:
@@ -22,7 +18,6 @@ class RepoAnalyzer:
     def __init__(self, gh_instance):
         self.gh = gh_instance
 
-    @limiter.ratelimit("github", delay=True)
     def search_repos_by_readme(self, keyword, num_stars, days_ago, page):
         """Search for repos by readme content."""
         query = f'"{keyword}" in:readme stars:>={num_stars} pushed:{(datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")}..*'
@@ -69,7 +64,6 @@ class RepoDetails:
         self.open_issues = repo.open_issues_count
         self.closed_issues = repo.get_issues(state="closed").totalCount
         self.languages = repo.get_languages()
-        self.readme = self.get_repo_readme_content()
         self.topics = repo.get_topics()
         self.num_pulls = repo.get_pulls().totalCount
         self.num_contributors = len(self.get_repo_contributors())
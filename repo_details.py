@@ -1,4 +1,3 @@
-import base64
 import json
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
@@ -13,47 +12,131 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 
 from config import PROGRESS_FILE
 from detect_license import LicenseParser
+from gh_readme import fetch_readme
+from gh_telemetry import telemetry
 from utils import preprocess_text
 
 
+def parse_timestamp(value):
+    """Parse a GitHub API timestamp the way PyGithub does"""
+    if value is None:
+        return None
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+
+
 def save_progress(keyword, page):
     progress_data = {"keyword": keyword, "last_page": page}
     with open(PROGRESS_FILE, "w") as progress_file:
         json.dump(progress_data, progress_file)
 
 
-from tenacity import retry, stop_after_attempt, wait_exponential
-
-
 class RepoDetails:
     """Class to hold the details of a repo"""
 
-    def __init__(self, repo):
+    # set on records that only carry the counters of an unchanged, stored repo
+    refresh_only = False
+    # set when the readme was cut at README_MAX_BYTES
+    readme_truncated = False
+
+    def __init__(self, repo, executor=None):
         self.repo = repo
         self.id = repo.id
         self.url = repo.html_url
-        self.license = self.get_repo_license()
-        self.readme = self.get_repo_readme_content()
+        fetched = self._fetch_sub_resources(executor)
+        self.license = fetched["license"]
+        self.readme = fetched["readme"]
         self.stars_count = repo.stargazers_count
         self.forks_count = repo.forks_count
         self.pushed_at = repo.pushed_at
         self.updated_at = repo.updated_at
         self.created_at = repo.created_at
         self.languages = "| ".join(
-            [f"{k} ({v})" for k, v in self.get_repo_languages().items()]
+            [f"{k} ({v})" for k, v in fetched["languages"].items()]
         )
-        self.topics = self.get_topics()
-        self.open_issues = self.get_open_issues().totalCount
-        self.closed_issues = self.get_closed_issues().totalCount
+        self.topics = fetched["topics"]
+        self.open_issues = fetched["open_issues"]
+        self.closed_issues = fetched["closed_issues"]
         self.description = repo.description
         self.fork = 1 if repo.fork else 0
         self.size = repo.size
         self.watchers_count = repo.watchers_count
         self.language = repo.language
-        self.readme = self.get_repo_readme_content()
+
+    @classmethod
+    def from_fields(cls, repo, **fields):
+        """Build the details of a repo from already fetched fields, without any API calls"""
+        repo_details = cls.__new__(cls)
+        repo_details.repo = repo
+        repo_details.__dict__.update(fields)
+        return repo_details
+
+    @classmethod
+    def from_search_payload(cls, repo, executor=None, refresh_only=False):
+        """Build the details of a repo from its search result.
+
+        Only what the search payload lacks is fetched: the readme, the languages,
+        the number of closed issues and, for licenses GitHub does not recognise,
+        the license file. With refresh_only nothing is fetched, the record only
+        refreshes the counters of a stored repo.
+        """
+        # raw_data would complete the repo with a GET /repos/{owner}/{repo} call
+        data = repo._rawData
+        license_data = data.get("license")
+        repo_details = cls.from_fields(
+            repo,
+            id=data["id"],
+            url=data["html_url"],
+            stars_count=data["stargazers_count"],
+            forks_count=data["forks_count"],
+            pushed_at=parse_timestamp(data["pushed_at"]),
+            updated_at=parse_timestamp(data["updated_at"]),
+            created_at=parse_timestamp(data["created_at"]),
+            topics=data.get("topics", []),
+            open_issues=data["open_issues_count"],
+            description=data["description"],
+            fork=1 if data["fork"] else 0,
+            size=data["size"],
+            watchers_count=data["watchers_count"],
+            language=data["language"],
+        )
+        if refresh_only:
+            repo_details.refresh_only = True
+            return repo_details
+        names = ["readme", "languages", "closed_issues"]
+        if license_data is None:
+            repo_details.license = "Unknown License"
+        elif license_data["name"] != "Other":
+            repo_details.license = license_data["name"]
+        else:
+            names.append("license")
+        fetched = repo_details._fetch_sub_resources(executor, names)
+        repo_details.__dict__.update(fetched)
+        repo_details.languages = "| ".join(
+            [f"{k} ({v})" for k, v in fetched["languages"].items()]
+        )
+        return repo_details
+
+    def _fetch_sub_resources(self, executor=None, names=None):
+        """Fetch the sub-resources of the repo, all at once when given an executor"""
+        getters = {
+            "license": self.get_repo_license,
+            "readme": self.get_repo_readme_content,
+            "languages": self.get_repo_languages,
+            "topics": self.get_topics,
+            "open_issues": self.get_open_issues,
+            "closed_issues": self.get_closed_issues,
+        }
+        if names is not None:
+            getters = {name: getters[name] for name in names}
+        if executor is None:
+            return {name: getter() for name, getter in getters.items()}
+        futures = {name: executor.submit(getter) for name, getter in getters.items()}
+        return {name: future.result() for name, future in futures.items()}
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_repo_license(self):
         """Get the license of the repo"""
@@ -64,48 +147,58 @@ class RepoDetails:
         return LicenseParser(license_file).parse()
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_repo_readme_content(self):
-        """Get the readme content of the repo"""
-        readme = self.repo.get_readme()
+        """Get the readme content of the repo, up to README_MAX_BYTES of it"""
+        readme, self.readme_truncated = fetch_readme(self.repo)
         if readme is not None:
-            return preprocess_text(
-                base64.b64decode(readme.content).decode("utf-8").lower()
-            )
+            return preprocess_text(readme.lower())
         else:
             return "no readme found"
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_repo_languages(self):
         """Get the languages of the repo"""
         return self.repo.get_languages()
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_topics(self):
         """Get the topics of the repo"""
         return self.repo.get_topics()
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_open_issues(self):
-        """Get the open issues of the repo"""
-        return self.repo.get_issues(state="open")
+        """Get the number of open issues of the repo"""
+        return self.repo.get_issues(state="open").totalCount
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_closed_issues(self):
-        """Get the closed issues of the repo"""
-        return self.repo.get_issues(state="closed")
+        """Get the number of closed issues of the repo"""
+        return self.repo.get_issues(state="closed").totalCount
 
     @retry(
-        stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1.2, min=4, max=15)
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1.2, min=4, max=15),
+        before_sleep=telemetry.record_tenacity_retry,
     )
     def get_repo_contributors(self):
         """Get the contributors of the repo"""
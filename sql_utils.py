@@ -1,46 +1,67 @@
 import pandas as pd
 import sqlite3
-import os
-from datetime import datetime
+import threading
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED,
+                                ThreadPoolExecutor, wait)
+from datetime import datetime, timedelta
 from openai_utils import get_relevancy_score_and_reasons
-from openai_utils import classify_readme_category
 from openai_utils import summarize_readme
+from openai_utils import RELEVANCY_VERSION, SUMMARY_VERSION, get_llm_cache
+from openai_utils import COMBINED_VERSION, enrich_readme
+from embeddings import CLASSIFIER_VERSION
 from utils import classify_readme
 from summary import generate_summary as summary
 from utils import print
+from config import (ENRICH_CONCURRENCY, ENRICH_MODE, METRICS_DAILY_DAYS,
+                    METRICS_WEEKLY_DAYS, PROCESS_BATCH_SIZE)
+from db import connect
+from readme_store import (create_readme_table, get_readmes,
+                          migrate_readme_column, prune_readmes, put_readmes,
+                          readme_hash)
 
 current_timestamp = datetime.utcnow()
 
+# the keywords of d other than its first one, joined with '|' as in the csv
+_ADDITIONAL_KEYWORDS = """
+    (SELECT COALESCE(group_concat(k.keyword, '|'), '') FROM repo_keywords k
+        WHERE k.id = d.id AND k.keyword != d.keyword) AS additional_keywords
+"""
+
 
 def export_table_to_csv_pandas(filename):
     """Export repos db to csv."""
-    conn = sqlite3.connect("./db/repos.sqlite")
-    df = pd.read_sql_query("SELECT * FROM repo_details", conn)
+    conn = connect(readonly=True)
+    df = pd.read_sql_query(f"SELECT d.*, {_ADDITIONAL_KEYWORDS} FROM repo_details d", conn)
     df.to_csv(filename, index=False)
     print(f"Data exported to {filename}")
     conn.close()
 
 def print_top_k_pandas(k, order_by='stars_count', ascending=False):
     """Print top k records ordered by repos db."""
-    conn = sqlite3.connect("./db/repos.sqlite")
-    df = pd.read_sql_query("SELECT * FROM repo_details", conn)
-    print(f"processing {len(df)} repos, please wait...")
-    df = df.sort_values(by=order_by, ascending=ascending).head(k)
+    conn = connect(readonly=True)
+    # order_by is an indexed column, so this reads k rows instead of the table
+    df = pd.read_sql_query(
+        f'SELECT * FROM repo_details ORDER BY "{order_by}" {"ASC" if ascending else "DESC"} LIMIT ?',
+        conn,
+        params=(k,),
+    )
     print(f"Top {k} records ordered by {order_by}:")
     print(df)
     conn.close()
 
-def create_database_table():
-    """Create database table for repo data."""
-    if not os.path.exists('./db'):
-        os.makedirs('./db')
-    conn = sqlite3.connect("./db/repos.sqlite")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS repo_details
+def _add_missing_columns(cursor, table, columns):
+    """Add the columns a table created by an older version lacks."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+_CREATE_REPO_DETAILS = '''CREATE TABLE IF NOT EXISTS repo_details
                 (id INTEGER PRIMARY KEY,
                 url TEXT UNIQUE,
                 license TEXT DEFAULT 'Unknown License',
-                readme TEXT DEFAULT '',
+                readme_hash TEXT DEFAULT NULL,
                 stars_count INTEGER DEFAULT 0,
                 forks_count INTEGER DEFAULT 0,
                 pushed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -56,203 +77,535 @@ def create_database_table():
                 watchers_count INTEGER DEFAULT 0,
                 language TEXT DEFAULT '',
                 keyword TEXT DEFAULT '',
-                additional_keywords TEXT DEFAULT '',
                 is_relevant INTEGER DEFAULT NULL,
                 brief_desc TEXT DEFAULT NULL,
                 class_label TEXT DEFAULT NULL,
                 num_stars INTEGER DEFAULT 0,
                 days_ago INTEGER DEFAULT 0,
-                fetch_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+                fetch_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                readme_truncated INTEGER DEFAULT 0,
+                processed_readme_hash TEXT DEFAULT NULL,
+                is_relevant_version TEXT DEFAULT NULL,
+                brief_desc_version TEXT DEFAULT NULL,
+                class_label_version TEXT DEFAULT NULL)'''
+
+# columns the exports filter, group and order by
+INDEXED_COLUMNS = ['is_relevant', 'class_label', 'stars_count', 'pushed_at']
+
+def _migrate_keywords(cursor):
+    """Move '|'-joined additional_keywords and pending_keywords to repo_keywords."""
+    cursor.execute("PRAGMA table_info(repo_details)")
+    if 'additional_keywords' in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("""INSERT OR IGNORE INTO repo_keywords (keyword, id)
+            SELECT keyword, id FROM repo_details WHERE keyword != ''""")
+        cursor.execute("SELECT id, additional_keywords FROM repo_details WHERE additional_keywords != ''")
+        cursor.executemany(
+            "INSERT OR IGNORE INTO repo_keywords (keyword, id) VALUES (?, ?)",
+            [(keyword, repo_id)
+             for repo_id, keywords in cursor.fetchall()
+             for keyword in keywords.split('|') if keyword],
+        )
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            cursor.execute("ALTER TABLE repo_details DROP COLUMN additional_keywords")
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pending_keywords'")
+    if cursor.fetchone() is not None:
+        cursor.execute('''INSERT OR IGNORE INTO repo_keywords (keyword, id)
+            SELECT keyword, id FROM pending_keywords''')
+        cursor.execute("DROP TABLE pending_keywords")
+
+def _restore_primary_key(cursor):
+    """Rebuild a repo_details that lost its keys to a pandas to_sql replace."""
+    cursor.execute("PRAGMA table_info(repo_details)")
+    columns = {row[1]: row[5] for row in cursor.fetchall()}
+    if columns.get('id'):
+        return
+    cursor.execute("ALTER TABLE repo_details RENAME TO repo_details_unkeyed")
+    cursor.execute(_CREATE_REPO_DETAILS)
+    cursor.execute("PRAGMA table_info(repo_details)")
+    shared = ', '.join(row[1] for row in cursor.fetchall() if row[1] in columns)
+    cursor.execute(f"""INSERT OR REPLACE INTO repo_details ({shared})
+        SELECT {shared} FROM repo_details_unkeyed""")
+    cursor.execute("DROP TABLE repo_details_unkeyed")
+
+def create_database_table():
+    """Create database table for repo data."""
+    conn = connect()
+    c = conn.cursor()
+    c.execute(_CREATE_REPO_DETAILS)
+    _add_missing_columns(c, 'repo_details', {
+        'readme_truncated': 'INTEGER DEFAULT 0',
+        'readme_hash': 'TEXT DEFAULT NULL',
+        'processed_readme_hash': 'TEXT DEFAULT NULL',
+        'is_relevant_version': 'TEXT DEFAULT NULL',
+        'brief_desc_version': 'TEXT DEFAULT NULL',
+        'class_label_version': 'TEXT DEFAULT NULL',
+    })
+    # readmes live in readme_blobs, stored once however many rows share them
+    create_readme_table(c)
+    migrated = migrate_readme_column(c, 'repo_details')
+    # every keyword a repo was found by, keyword is the first of them
+    c.execute('''CREATE TABLE IF NOT EXISTS repo_keywords
+                (keyword TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (keyword, id)) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS repo_keywords_id ON repo_keywords (id)")
+    _migrate_keywords(c)
+    _restore_primary_key(c)
+    for column in INDEXED_COLUMNS:
+        c.execute(f"CREATE INDEX IF NOT EXISTS repo_details_{column} ON repo_details ({column})")
     conn.commit()
+    if migrated:
+        conn.execute("VACUUM")
     conn.close()
 
+# counters tracked over time, a row is written only when one of them changes
+METRIC_COLUMNS = [
+    'stars_count', 'forks_count', 'watchers_count', 'open_issues', 'closed_issues',
+    'size',
+]
+_metric_columns = ', '.join(METRIC_COLUMNS)
+
+# repo_details rows whose counters differ from their last recorded point
+_RECORD_METRICS = f"""
+    INSERT INTO repo_metrics (id, timestamp, {_metric_columns})
+    SELECT d.id, :timestamp, {', '.join(f'd.{c}' for c in METRIC_COLUMNS)}
+    FROM repo_details d
+    WHERE {{where}} AND NOT EXISTS (
+        SELECT 1 FROM repo_metrics m
+        WHERE m.id = d.id
+            AND m.timestamp = (SELECT MAX(timestamp) FROM repo_metrics WHERE id = d.id)
+            AND {' AND '.join(f'm.{c} IS d.{c}' for c in METRIC_COLUMNS)}
+    )
+    ON CONFLICT(id, timestamp) DO UPDATE SET
+        {', '.join(f'{c}=excluded.{c}' for c in METRIC_COLUMNS)}
+"""
+
+# the change points of a repo_history kept before repo_metrics
+_MIGRATE_HISTORY = f"""
+    INSERT OR IGNORE INTO repo_metrics (id, timestamp, {_metric_columns})
+    SELECT id, timestamp, {_metric_columns} FROM (
+        SELECT id, timestamp, {_metric_columns},
+            ROW_NUMBER() OVER w AS point,
+            {', '.join(f'LAG({c}) OVER w AS last_{c}' for c in METRIC_COLUMNS)}
+        FROM repo_history WHERE timestamp IS NOT NULL
+        WINDOW w AS (PARTITION BY id ORDER BY timestamp)
+    )
+    WHERE point = 1 OR {' OR '.join(f'last_{c} IS NOT {c}' for c in METRIC_COLUMNS)}
+"""
+
 def create_history_database_table():
-    conn = sqlite3.connect("./db/repos.sqlite")
+    """Create the metrics history table, migrating an older repo_history."""
+    conn = connect()
     cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS repo_history (
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS repo_metrics (
             id INTEGER NOT NULL,
-            url TEXT,
-            license TEXT DEFAULT 'Unknown License',
-            readme TEXT DEFAULT '',
-            stars_count INTEGER DEFAULT 0,
-            forks_count INTEGER DEFAULT 0,
-            pushed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            languages TEXT DEFAULT '',
-            topics TEXT DEFAULT '',
-            open_issues INTEGER DEFAULT 0,
-            closed_issues INTEGER DEFAULT 0,
-            description TEXT DEFAULT '',
-            fork INTEGER DEFAULT 0,
-            size INTEGER DEFAULT 0,
-            watchers_count INTEGER DEFAULT 0,
-            language TEXT DEFAULT '',
-            keyword TEXT DEFAULT '',
-            additional_keywords TEXT DEFAULT '',
-            is_relevant INTEGER DEFAULT NULL,
-            brief_desc TEXT DEFAULT NULL,
-            class_label TEXT DEFAULT NULL,
-            num_stars INTEGER DEFAULT 0,
-            days_ago INTEGER DEFAULT 0,
-            fetch_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            timestamp TIMESTAMP
-        )
+            timestamp TIMESTAMP NOT NULL,
+            {', '.join(f'{c} INTEGER' for c in METRIC_COLUMNS)},
+            PRIMARY KEY (id, timestamp)
+        ) WITHOUT ROWID
     """)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='repo_history'")
+    migrated = cursor.fetchone() is not None
+    if migrated:
+        # the rest of a history row was a copy of repo_details at the time
+        cursor.execute(_MIGRATE_HISTORY)
+        points = cursor.rowcount
+        cursor.execute("DROP TABLE repo_history")
+        create_readme_table(cursor)
+        prune_readmes(cursor)
+        print(f"Moved repo_history into repo_metrics, {points} points kept.")
     conn.commit()
+    if migrated:
+        conn.execute("VACUUM")
     conn.close()
 
+def _record_metrics(cursor, timestamp, repo_ids=None):
+    """Record the counters of repo_ids, or of every repo, where they changed"""
+    if repo_ids is None:
+        cursor.execute(_RECORD_METRICS.format(where="1"), {"timestamp": timestamp})
+    else:
+        cursor.executemany(
+            _RECORD_METRICS.format(where="d.id = :id"),
+            [{"timestamp": timestamp, "id": repo_id} for repo_id in repo_ids],
+        )
+
 def initialize_repo_history():
     """Initialize repo history table with existing repo details."""
-    conn = sqlite3.connect("./db/repos.sqlite")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM repo_details")
-    repo_details_data = cursor.fetchall()
-    for row in repo_details_data:
-        cursor.execute("""
-            INSERT INTO repo_history (
-                id, url, license, readme, stars_count, forks_count, pushed_at,
-                updated_at, created_at, languages, topics, open_issues,
-                closed_issues, description, fork, size, watchers_count,
-                language, keyword, additional_keywords, num_stars, days_ago, fetch_date, timestamp
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (*row,datetime.utcnow(), datetime.utcnow()))
-    conn.commit()
+    conn = connect()
+    with conn:
+        _record_metrics(conn.cursor(), datetime.utcnow())
     conn.close()
 
 def get_new_repos():
-    """Get new repos from repo details table."""
-    conn = sqlite3.connect("./db/repos.sqlite")
+    """Get repos from repo details table with no recorded history yet."""
+    conn = connect(readonly=True)
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT * FROM repo_details
-        WHERE id NOT IN (SELECT DISTINCT id FROM repo_history)
+        SELECT d.* FROM repo_details d
+        WHERE NOT EXISTS (SELECT 1 FROM repo_metrics m WHERE m.id = d.id)
     """)
     new_repos = cursor.fetchall()
     conn.close()
     return new_repos
 
+def downsample_repo_metrics(now=None):
+    """Keep only the last metrics point of every week or month of old history."""
+    ensure_tables()
+    now = now or datetime.utcnow()
+    # weeks are keyed by their Monday, so a week across new year stays whole
+    tiers = [
+        ("strftime('%Y-%m', timestamp)", datetime.min, now - timedelta(days=METRICS_WEEKLY_DAYS)),
+        ("date(timestamp, 'weekday 0', '-6 days')", now - timedelta(days=METRICS_WEEKLY_DAYS), now - timedelta(days=METRICS_DAILY_DAYS)),
+    ]
+    conn = connect()
+    with conn:
+        cursor = conn.cursor()
+        removed = 0
+        for bucket, since, until in tiers:
+            cursor.execute(f"""
+                DELETE FROM repo_metrics
+                WHERE timestamp >= :since AND timestamp < :until
+                AND (id, timestamp) NOT IN (
+                    SELECT id, MAX(timestamp) FROM repo_metrics
+                    WHERE timestamp >= :since AND timestamp < :until
+                    GROUP BY id, {bucket}
+                )
+            """, {"since": since, "until": until})
+            removed += cursor.rowcount
+    conn.close()
+    return removed
+
 def reset_repo_info():
     """Reset the repo_details table."""
-    conn = sqlite3.connect("./db/repos.sqlite")
+    ensure_tables()
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='repo_details'")
     table_exists = cursor.fetchone() is not None
     if table_exists:
         cursor.execute("DELETE FROM repo_details")
+        cursor.execute("DELETE FROM repo_keywords")
+        prune_readmes(cursor)
         conn.commit()
         print("Deleted all records from the 'repo_details' table.")
     else:
         print("Table 'repo_details' does not exist.")
     conn.close()
 
-def save_results_to_db(repos, num_stars, days_ago):
-    """Save repo data to database."""
-    create_database_table()
-    create_history_database_table()
-    conn = sqlite3.connect("./db/repos.sqlite")
+def _timestamp_key(value):
+    """Normalize a timestamp from the API or from the db, for comparison"""
+    return str(value)[:19].replace("T", " ")
+
+
+def get_unchanged_repo_ids(pushed_at_by_id):
+    """Get the ids of the repos stored with the same pushed_at as given.
+
+    Called from the fetch threads, once ensure_tables has run.
+    """
+    conn = connect()
     cursor = conn.cursor()
+    ids = list(pushed_at_by_id)
+    cursor.execute(
+        f"SELECT id, pushed_at FROM repo_details WHERE id IN ({','.join('?' * len(ids))})",
+        ids,
+    )
+    unchanged_ids = {
+        repo_id
+        for repo_id, pushed_at in cursor.fetchall()
+        if pushed_at is not None
+        and _timestamp_key(pushed_at) == _timestamp_key(pushed_at_by_id[repo_id])
+    }
+    conn.close()
+    return unchanged_ids
+
+_UPSERT_REPO = """
+    INSERT INTO repo_details (
+        id, url, license, readme_hash, stars_count, forks_count, pushed_at,
+        updated_at, created_at, languages, topics, open_issues,
+        closed_issues, description, fork, size, watchers_count,
+        language, keyword, num_stars, days_ago, fetch_date, readme_truncated
+    ) VALUES (
+        :id, :url, :license, :readme_hash, :stars_count, :forks_count, :pushed_at,
+        :updated_at, :created_at, :languages, :topics, :open_issues,
+        :closed_issues, :description, :fork, :size, :watchers_count,
+        :language, :keyword, :num_stars, :days_ago, :fetch_date, :readme_truncated
+    )
+    ON CONFLICT(id) DO UPDATE SET
+        url=excluded.url, license=excluded.license, readme_hash=excluded.readme_hash,
+        stars_count=excluded.stars_count, forks_count=excluded.forks_count,
+        pushed_at=excluded.pushed_at, updated_at=excluded.updated_at,
+        created_at=excluded.created_at, languages=excluded.languages,
+        topics=excluded.topics, open_issues=excluded.open_issues,
+        closed_issues=excluded.closed_issues, description=excluded.description,
+        fork=excluded.fork, size=excluded.size,
+        watchers_count=excluded.watchers_count, language=excluded.language,
+        num_stars=excluded.num_stars, days_ago=excluded.days_ago,
+        fetch_date=excluded.fetch_date, readme_truncated=excluded.readme_truncated
+"""
+
+# unchanged since the last fetch, only the counters moved
+_REFRESH_REPO = """
+    UPDATE repo_details SET
+        stars_count=:stars_count, forks_count=:forks_count,
+        watchers_count=:watchers_count, open_issues=:open_issues, size=:size,
+        updated_at=:updated_at, description=:description, fetch_date=:fetch_date
+    WHERE id=:id
+"""
+
+# also for repos not saved yet, found again while their hydration is in flight
+_ADD_KEYWORD = "INSERT OR IGNORE INTO repo_keywords (keyword, id) VALUES (:keyword, :id)"
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def ensure_tables():
+    """Create the tables once per process, not on every save."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    # threads calling it at once would race the migrations
+    with _tables_lock:
+        if not _tables_ready:
+            create_database_table()
+            create_history_database_table()
+            _tables_ready = True
+
+
+def _repo_params(repo_info, num_stars, days_ago):
+    if repo_info.refresh_only:
+        return {
+            "id": repo_info.id, "keyword": repo_info.keyword,
+            "stars_count": repo_info.stars_count, "forks_count": repo_info.forks_count,
+            "watchers_count": repo_info.watchers_count,
+            "open_issues": repo_info.open_issues, "size": repo_info.size,
+            "updated_at": repo_info.updated_at, "description": repo_info.description,
+            "fetch_date": current_timestamp,
+        }
+    return {
+        "id": repo_info.id, "url": repo_info.url, "license": repo_info.license,
+        "readme_hash": readme_hash(repo_info.readme),
+        "stars_count": repo_info.stars_count,
+        "forks_count": repo_info.forks_count, "pushed_at": repo_info.pushed_at,
+        "updated_at": repo_info.updated_at, "created_at": repo_info.created_at,
+        "languages": repo_info.languages, "topics": '|'.join(repo_info.topics),
+        "open_issues": repo_info.open_issues, "closed_issues": repo_info.closed_issues,
+        "description": repo_info.description, "fork": repo_info.fork,
+        "size": repo_info.size, "watchers_count": repo_info.watchers_count,
+        "language": repo_info.language, "keyword": repo_info.keyword,
+        "num_stars": num_stars, "days_ago": days_ago, "fetch_date": current_timestamp,
+        "readme_truncated": int(repo_info.readme_truncated),
+    }
+
+
+def save_results_to_db(repos, num_stars, days_ago):
+    """Save repo data to database, as one batch in a single transaction."""
+    ensure_tables()
+    full_rows, refresh_rows, readmes = [], [], {}
     for repo_info in repos:
-        cursor.execute("SELECT * FROM repo_details WHERE id=?", (repo_info.id,))
-        existing_row = cursor.fetchone()
-        if existing_row:
-            existing_row_dict = dict(zip([description[0] for description in cursor.description], existing_row))
-            existing_keywords = set(existing_row_dict['additional_keywords'].split('|'))
-            if repo_info.keyword != existing_row_dict['keyword'] and repo_info.keyword not in existing_keywords:
-                updated_additional_keywords = '|'.join(existing_keywords | {repo_info.keyword})
-                cursor.execute(
-                    "UPDATE repo_details SET additional_keywords=? WHERE id=?",
-                    (updated_additional_keywords, repo_info.id)
-                )
-        else:
-            cursor.execute("""
-                INSERT INTO repo_details (
-                    id, url, license, readme, stars_count, forks_count, pushed_at,
-                    updated_at, created_at, languages, topics, open_issues,
-                    closed_issues, description, fork, size, watchers_count,
-                    language, keyword, additional_keywords, num_stars, days_ago, fetch_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                repo_info.id, repo_info.url, repo_info.license, repo_info.readme,
-                repo_info.stars_count, repo_info.forks_count, repo_info.pushed_at,
-                repo_info.updated_at, repo_info.created_at, repo_info.languages,
-                '|'.join(repo_info.topics), repo_info.open_issues,
-                repo_info.closed_issues, repo_info.description, repo_info.fork,
-                repo_info.size, repo_info.watchers_count, repo_info.language,
-                repo_info.keyword, '|'.join(repo_info.additional_keywords), num_stars, days_ago, current_timestamp,
-            ))
-        cursor.execute("""
-            INSERT OR REPLACE INTO repo_history (
-                id, url, license, readme, stars_count, forks_count, pushed_at,
-                updated_at, created_at, languages, topics, open_issues,
-                closed_issues, description, fork, size, watchers_count,
-                language, keyword, additional_keywords, num_stars, days_ago, fetch_date, timestamp
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            repo_info.id, repo_info.url, repo_info.license, repo_info.readme,
-            repo_info.stars_count, repo_info.forks_count, repo_info.pushed_at,
-            repo_info.updated_at, repo_info.created_at, repo_info.languages,
-            '|'.join(repo_info.topics), repo_info.open_issues,
-            repo_info.closed_issues, repo_info.description, repo_info.fork,
-            repo_info.size, repo_info.watchers_count, repo_info.language,
-            repo_info.keyword, '|'.join(repo_info.additional_keywords),
-            num_stars, days_ago, current_timestamp, current_timestamp
-        ))
-    conn.commit()
-    conn.close()  
+        rows = refresh_rows if repo_info.refresh_only else full_rows
+        rows.append(_repo_params(repo_info, num_stars, days_ago))
+        if not repo_info.refresh_only and rows[-1]["readme_hash"]:
+            readmes[rows[-1]["readme_hash"]] = repo_info.readme
+    conn = connect()
+    with conn:
+        cursor = conn.cursor()
+        put_readmes(cursor, readmes)
+        cursor.executemany(_UPSERT_REPO, full_rows)
+        cursor.executemany(_REFRESH_REPO, refresh_rows)
+        cursor.executemany(_ADD_KEYWORD, full_rows + refresh_rows)
+        _record_metrics(
+            cursor,
+            current_timestamp,
+            dict.fromkeys(row["id"] for row in full_rows + refresh_rows),
+        )
+    conn.close()
+
+def prune_replaced_readmes():
+    """Delete the readmes of older versions, once every batch of a fetch is saved."""
+    conn = connect()
+    with conn:
+        prune_readmes(conn.cursor())
+    conn.close()
 
 import re
 from nltk.tokenize import sent_tokenize
 import nltk
 nltk.download("punkt")
 
-from rich.progress import Progress
+from rich.progress import (BarColumn, MofNCompleteColumn, Progress,
+                           ProgressColumn, TextColumn, TimeRemainingColumn)
+from rich.text import Text
 def process_brief_desc(text):
     text = " ".join(text.split())
     sentences = sent_tokenize(text)
     return " ".join(sentences[:3])
 
 
+# a field is stale when missing, produced from another readme, or produced by
+# another model or prompt than the current one
+_STALE = """
+    {field} IS NULL
+    OR processed_readme_hash IS NOT readme_hash
+    OR {field}_version IS NOT :{field}_version
+"""
+
+_SELECT_STALE = f"""
+    SELECT id, readme_hash, is_relevant, brief_desc, class_label,
+        {_STALE.format(field='is_relevant')} AS relevancy_stale,
+        {_STALE.format(field='brief_desc')} AS summary_stale,
+        {_STALE.format(field='class_label')} AS label_stale
+    FROM repo_details
+    WHERE relevancy_stale OR summary_stale OR label_stale
+"""
+
+_WRITE_BACK = """
+    UPDATE repo_details SET
+        is_relevant=:is_relevant, brief_desc=:brief_desc, class_label=:class_label,
+        is_relevant_version=:is_relevant_version,
+        brief_desc_version=:brief_desc_version,
+        class_label_version=:class_label_version,
+        processed_readme_hash=:readme_hash
+    WHERE id=:id
+"""
+
+_FIELD_VERSIONS = {
+    "is_relevant_version": RELEVANCY_VERSION,
+    "brief_desc_version": SUMMARY_VERSION,
+    "class_label_version": CLASSIFIER_VERSION,
+}
+if ENRICH_MODE == "combined":
+    # one request makes every field, switching modes makes them all stale
+    _FIELD_VERSIONS = dict.fromkeys(_FIELD_VERSIONS, COMBINED_VERSION)
+
+class _RateColumn(ProgressColumn):
+    """Fields done per minute, the unit the API budget is counted in."""
+
+    def render(self, task):
+        if not task.speed:
+            return Text("--/min", style="progress.data.speed")
+        return Text(f"{task.speed * 60:.1f}/min", style="progress.data.speed")
+
+
+def _make_enrich_progress():
+    return Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        _RateColumn(),
+        TimeRemainingColumn(),
+    )
+
+
+def _enrich_row(row, readme, progress, tasks):
+    """Recompute the stale fields of a row, run on the enrichment executor.
+
+    A field whose calls failed is left NULL, so the row stays stale.
+    """
+    (repo_id, readme_hash, is_relevant, brief_desc, class_label,
+     relevancy_stale, summary_stale, label_stale) = row
+    if ENRICH_MODE == "combined":
+        fields = enrich_readme(readme)
+        for stale, task in zip((relevancy_stale, summary_stale, label_stale), tasks):
+            if stale:
+                progress.update(task, advance=1)
+        return {
+            "id": repo_id, "readme_hash": readme_hash,
+            "is_relevant": fields["score"] if relevancy_stale else is_relevant,
+            "brief_desc": fields["summary"] if summary_stale else brief_desc,
+            "class_label": fields["category"] if label_stale else class_label,
+            **_FIELD_VERSIONS,
+        }
+    if relevancy_stale:
+        is_relevant = get_relevancy_score_and_reasons(readme)["score"]
+        progress.update(tasks[0], advance=1)
+    if summary_stale:
+        brief_desc = summarize_readme(readme)
+        progress.update(tasks[1], advance=1)
+    if label_stale and brief_desc is None:
+        # the summary failed, the label waits for it on the next run
+        class_label = None
+    elif label_stale:
+        class_label = classify_readme(readme=readme, readme_summary=brief_desc, use_openai=False)
+        progress.update(tasks[2], advance=1)
+    return {
+        "id": repo_id, "readme_hash": readme_hash, "is_relevant": is_relevant,
+        "brief_desc": brief_desc, "class_label": class_label, **_FIELD_VERSIONS,
+    }
+
+
 def process_repo_details():
-    """Process repo details and update database table."""
-    conn = sqlite3.connect("./db/repos.sqlite")
-    df = pd.read_sql_query("SELECT * FROM repo_details", conn)
-    n = len(df)
-
-    with Progress() as progress:
-        task1 = progress.add_task("[cyan]Processing relevancy...", total=n)
-        task2 = progress.add_task("[magenta]Processing summaries...", total=n)
-        task3 = progress.add_task("[green]Processing class labels...", total=n)
-
-        def update_progress(task):
-            progress.update(task, advance=1)
-
-        def get_relevancy_score(row):
-            result = get_relevancy_score_and_reasons(row['readme'])["score"]
-            update_progress(task1)
-            return result
-
-        def get_summary(row):
-            result = summarize_readme(row['readme'])
-            update_progress(task2)
-            return result
-
-        def get_class_label(row):
-            result = classify_readme(readme=row['readme'], readme_summary=row['brief_desc'], use_openai=False)
-            update_progress(task3)
-            return result
-
-        df['is_relevant'] = df.apply(get_relevancy_score, axis=1)
-        df['brief_desc'] = df.apply(get_summary, axis=1)
-        df['class_label'] = df.apply(get_class_label, axis=1)
-    df.to_sql('repo_details', conn, if_exists='replace', index=False)
+    """Process the repos with stale fields, writing the results back in batches.
+
+    Rows are enriched ENRICH_CONCURRENCY at a time; the calls of every thread
+    share the rate limiter of openai_utils, and back off together on a 429.
+    """
+    ensure_tables()
+    conn = connect()
+    rows = conn.execute(_SELECT_STALE, _FIELD_VERSIONS).fetchall()
+    # a new summary changes the input of the classifier
+    rows = [(*row[:7], row[7] or row[6]) for row in rows]
+    results = []
+
+    def write_back():
+        # committed per batch, so a crash keeps the rows already done
+        with conn:
+            conn.executemany(_WRITE_BACK, results)
+        results.clear()
+
+    with _make_enrich_progress() as progress, ThreadPoolExecutor(
+        max_workers=ENRICH_CONCURRENCY
+    ) as executor:
+        tasks = [
+            progress.add_task("[cyan]Processing relevancy...", total=sum(row[5] for row in rows)),
+            progress.add_task("[magenta]Processing summaries...", total=sum(row[6] for row in rows)),
+            progress.add_task("[green]Processing class labels...", total=sum(row[7] for row in rows)),
+        ]
+        # future -> id of the repo it enriches
+        in_flight = {}
+
+        def collect(return_when):
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                repo_id = in_flight.pop(future)
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # one failed readme does not stop the others, it stays
+                    # stale and is retried on the next run
+                    print(f"Failed to process repo {repo_id}: {e}")
+            if len(results) >= PROCESS_BATCH_SIZE:
+                write_back()
+
+        try:
+            for start in range(0, len(rows), PROCESS_BATCH_SIZE):
+                batch = rows[start:start + PROCESS_BATCH_SIZE]
+                readmes = get_readmes(conn, [row[1] for row in batch])
+                for row in batch:
+                    # at most ENRICH_CONCURRENCY rows and their readmes in memory
+                    if len(in_flight) >= ENRICH_CONCURRENCY:
+                        collect(FIRST_COMPLETED)
+                    future = executor.submit(_enrich_row, row, readmes.get(row[1], ''), progress, tasks)
+                    in_flight[future] = row[0]
+            collect(ALL_COMPLETED)
+        finally:
+            if results:
+                write_back()
     conn.close()
 
 def process():
     timestamp_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     fname = f"./results/repos_{timestamp_str}.csv"
-    process_repo_details()   
+    process_repo_details()
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        print(
+            f"llm cache ({stats['mode']}): {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['bytes_saved'] / 1024:.0f} KiB not sent, "
+            f"{stats['evictions']} evictions"
+        )
     #export_table_to_csv_pandas(fname)
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+import gh_http
+from gh_cache import ResponseCache
+from gh_tokens import TokenPool
+
+URL = "https://api.github.com/repos/octo/repo"
+
+
+def _response(request, status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = b""
+    response._content_consumed = True
+    response.request = request
+    response.url = request.url
+    response.connection = None
+    return response
+
+
+def test_retry_after_rate_limit_revalidates_cached_body(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "http.db"), 1024 * 1024)
+    monkeypatch.setattr(gh_http, "_http_cache", cache)
+    monkeypatch.setattr(gh_http, "_http_cache_enabled", True)
+    monkeypatch.setattr(gh_http, "token_pool", TokenPool(["t"], pace=False))
+
+    session = gh_http._mount(requests.Session())
+    request = session.prepare_request(requests.Request("GET", URL))
+    cache.put(gh_http._cache_key(request), '"v1"', None, {}, b'{"stars": 1}')
+
+    answers = iter([(429, {"Retry-After": "0"}), (304, {"ETag": '"v1"'})])
+    sent = []
+
+    def send(self, request, **kwargs):
+        sent.append(dict(request.headers))
+        return _response(request, *next(answers))
+
+    monkeypatch.setattr(HTTPAdapter, "send", send)
+    response = session.send(request)
+
+    assert len(sent) == 2
+    assert all(headers["If-None-Match"] == '"v1"' for headers in sent)
+    assert response.status_code == 200
+    assert response.json() == {"stars": 1}
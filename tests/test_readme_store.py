@@ -0,0 +1,21 @@
+import sqlite3
+
+from readme_store import (create_readme_table, get_readme, prune_readmes,
+                          put_readmes, readme_hash)
+
+
+def test_prune_drops_overwritten_readme():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    create_readme_table(cursor)
+    cursor.execute("CREATE TABLE repo_details (id INTEGER PRIMARY KEY, readme_hash TEXT)")
+    old, new = "# repo\n", "# repo\n\nnow with docs\n"
+
+    put_readmes(cursor, {readme_hash(old): old})
+    cursor.execute("INSERT INTO repo_details VALUES (1, ?)", (readme_hash(old),))
+    put_readmes(cursor, {readme_hash(new): new})
+    cursor.execute("UPDATE repo_details SET readme_hash=? WHERE id=1", (readme_hash(new),))
+    prune_readmes(cursor)
+
+    assert get_readme(conn, readme_hash(old)) == ""
+    assert get_readme(conn, readme_hash(new)) == new